@@ -1,179 +1,816 @@
 # ai.py
 # This file contains all the AI logic, including the Minimax algorithm and board evaluation.
+# The search runs on the compact Bitboard representation (see bitboard.py).
 
+import json
 import math
+import os
 import random
+import time
+import warnings
 import config
+from bitboard import popcount, iter_bits
+import endgame
+import symmetry
+from evaluator import IncrementalEvaluator
+import mcts
+import opening_book
+import parallel_search
+import threats
+import transposition
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+WIN_SCORE = 100000
+# Nodes between clock reads when a search has a time budget
+BUDGET_CHECK_INTERVAL = 512
 
 def _find_immediate_threats(game, valid_moves):
     """
     Checks for immediate win or loss scenarios to speed up decision-making.
-    Returns the critical move if found, otherwise None.
+    Returns the critical move for the player to move if found, otherwise None.
     """
-    # Check if the AI can win in one move
+    board = game.bitboard
+    index = board.layout.index
+    me = game.current_player
+    opponent = config.HUMAN_PLAYER if me == config.AI_PLAYER else config.AI_PLAYER
+
+    # Check if we can win in one move
     for move in valid_moves:
-        temp_board = game.board.copy()
-        temp_board[move] = config.AI_PLAYER
-        # A lightweight check for a win from this move
-        if _is_winning_move(temp_board, move, config.AI_PLAYER):
+        if _is_winning_move(board, index[move], me):
             return move  # Take the winning move immediately
 
-    # Check if the Player can win in one move, and block them
+    # Check if the opponent can win in one move, and block them
     for move in valid_moves:
-        temp_board = game.board.copy()
-        temp_board[move] = config.HUMAN_PLAYER
-        if _is_winning_move(temp_board, move, config.HUMAN_PLAYER):
-            return move # Block the player's winning move
+        if _is_winning_move(board, index[move], opponent):
+            return move # Block the opponent's winning move
 
     return None
 
 def _is_winning_move(board, last_move, player):
     """
     A lightweight version of game_logic.check_win for internal AI use.
-    Checks if 'last_move' by 'player' resulted in a win on the given 'board'.
-    """
-    q, r = last_move
-    for dq, dr in [(1, 0), (0, 1), (-1, 1), (-1, 0), (0, -1), (1, -1)]:
-        line = [last_move]
-        # Check one direction
-        for i in range(1, config.WINNING_LENGTH):
-            pos = (q + dq * i, r + dr * i)
-            if board.get(pos) == player:
-                line.append(pos)
-            else:
-                break
-        if len(line) >= config.WINNING_LENGTH:
-            return True
-    return False
+    Checks if cell index 'last_move' by 'player' completes a line on the
+    given Bitboard, using the precomputed window masks through that cell.
+    """
+    return board.is_winning_move(last_move, player)
+
+def window_patterns(player_count, opponent_count, length):
+    """
+    Names of the config.EVAL_WEIGHTS patterns matched by a line holding
+    'player_count' of the evaluated side's tiles and 'opponent_count' of
+    the opponent's, the rest empty.
+    """
+    empty_count = length - player_count - opponent_count
+    patterns = []
+    if player_count == length:
+        patterns.append("line")
+    elif player_count == length - 1 and empty_count == 1:
+        patterns.append("one_short")
+    elif player_count == length - 2 and empty_count == 2:
+        patterns.append("two_short")
+
+    if opponent_count == length - 1 and empty_count == 1:
+        patterns.append("opponent_one_short")
+    elif opponent_count == length - 2 and empty_count == 2:
+        patterns.append("opponent_two_short")
+    return patterns
 
 def evaluate_sequence(sequence, player):
     """
-    Evaluates a single line of 4 tiles. This has been updated for more aggressive scoring.
+    Evaluates a single winning-length line of tiles. This has been updated for more aggressive scoring.
+    Patterns are relative to the line length, so the same weights apply to
+    4-, 5- or 6-in-a-row: a full line, one tile short, and two tiles short.
+    The weights are config.EVAL_WEIGHTS (see tune.py).
     """
-    score = 0
     opponent = config.HUMAN_PLAYER if player == config.AI_PLAYER else config.AI_PLAYER
-    
-    player_count = sequence.count(player)
-    empty_count = sequence.count(None)
-    opponent_count = sequence.count(opponent)
-
-    if player_count == 4:
-        score += 100000
-    elif player_count == 3 and empty_count == 1:
-        score += 1000
-    elif player_count == 2 and empty_count == 2:
-        score += 50
-
-    if opponent_count == 3 and empty_count == 1:
-        score -= 5000
-    elif opponent_count == 2 and empty_count == 2:
-        score -= 200
-        
-    return score
+    weights = config.EVAL_WEIGHTS
+    patterns = window_patterns(sequence.count(player), sequence.count(opponent), len(sequence))
+    return sum(weights[name] for name in patterns)
+
+def load_eval_weights(path=None):
+    """
+    Loads weights written by tune.py (default config.EVAL_WEIGHTS_PATH)
+    over config.EVAL_WEIGHTS. Returns False if there is no such file;
+    raises ValueError if it does not hold valid weights.
+    """
+    path = path or config.EVAL_WEIGHTS_PATH
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        weights = json.load(f)
+    if not isinstance(weights, dict):
+        raise ValueError(f"{path}: eval weights must be a JSON object")
+    unknown = set(weights) - set(config.EVAL_WEIGHTS)
+    if unknown:
+        raise ValueError(f"{path}: unknown eval weights {sorted(unknown)}")
+    if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in weights.values()):
+        raise ValueError(f"{path}: eval weights must be numbers")
+    config.EVAL_WEIGHTS.update(weights)
+    _window_score_tables.clear()
+    return True
+
+_window_score_tables = {}
+
+def _window_scores(length):
+    """
+    Table of evaluate_sequence results indexed by [ai_count][human_count],
+    so a window can be scored from two popcounts instead of a tile list.
+    """
+    table = _window_score_tables.get(length)
+    if table is None:
+        table = []
+        for ai_count in range(length + 1):
+            row = []
+            for human_count in range(length + 1):
+                empty_count = length - ai_count - human_count
+                if empty_count < 0:
+                    row.append(0)
+                    continue
+                sequence = ([config.AI_PLAYER] * ai_count
+                            + [config.HUMAN_PLAYER] * human_count
+                            + [None] * empty_count)
+                row.append(evaluate_sequence(sequence, config.AI_PLAYER))
+            table.append(row)
+        _window_score_tables[length] = table
+    return table
+
+# A broken weights file must not keep the game from starting
+try:
+    load_eval_weights()
+except (OSError, ValueError) as e:
+    warnings.warn(f"ignoring eval weights file: {e}")
 
 def evaluate_board(board):
     """
     Scores the entire board state from the perspective of the AI.
-    This version is more efficient than the previous one.
+    Every window is scored from the popcounts of the two player masks.
     """
+    scores = _window_scores(board.layout.winning_length)
+    ai_mask = board.masks[config.AI_PLAYER]
+    human_mask = board.masks[config.HUMAN_PLAYER]
     score = 0
-    # Iterate through every tile as a potential start of a line
-    for (q, r) in board:
-        # Check in the 3 primary directions to not double-count lines
-        for (dq, dr) in [(1, 0), (0, 1), (-1, 1)]:
-            sequence = []
-            is_valid_line = True
-            for i in range(config.WINNING_LENGTH):
-                pos = (q + dq * i, r + dr * i)
-                # Check if the tile is on the board
-                if pos in board:
-                    sequence.append(board[pos])
-                else:
-                    is_valid_line = False
-                    break
-            
-            if is_valid_line:
-                score += evaluate_sequence(sequence, config.AI_PLAYER)
+    for window in board.layout.windows:
+        score += scores[popcount(ai_mask & window)][popcount(human_mask & window)]
     return score
 
+def create_evaluator(board):
+    """An IncrementalEvaluator loaded with 'board', for use across a whole search."""
+    return IncrementalEvaluator.from_bitboard(board, _window_scores(board.layout.winning_length))
 
 def is_terminal_node(board):
     """Checks if the board is full (a draw)."""
-    return not any(v is None for v in board.values())
-
-def minimax(board, depth, maximizing_player, alpha, beta, last_move=None): # Add last_move parameter
-    """Minimax algorithm with alpha-beta pruning."""
-    
-    # This check is now more robust
-    if _is_winning_move(board, last_move, config.HUMAN_PLAYER) if last_move else False:
-        return -100000, last_move
-    if _is_winning_move(board, last_move, config.AI_PLAYER) if last_move else False:
-        return 100000, last_move
-    if is_terminal_node(board): # Draw
+    return board.is_full()
+
+class SearchStats:
+    """
+    Optional record of the work find_best_move did for one move. Pass an
+    instance in to have it filled; without one, nothing is collected.
+    """
+    def __init__(self):
+        self.nodes = 0
+        self.leaf_evals = 0
+        self.interior_nodes = 0     # nodes whose children were searched
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0 # cutoffs caused by the first move tried
+        self.depth = 0              # deepest completed iteration
+        self.score = None           # minimax score of the chosen move (AI's view), if searched
+        self.iteration_nodes = []   # nodes spent in each completed iteration
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.phase_times = {}       # seconds per phase: threats, book, search, total
+        self.source = None          # what produced the move: threat, mistake, book, search
+
+    def merge(self, other):
+        """Adds the counters of another stats dict (e.g. from a worker process)."""
+        for name in ("nodes", "leaf_evals", "interior_nodes", "beta_cutoffs",
+                     "first_move_cutoffs", "tt_probes", "tt_hits"):
+            setattr(self, name, getattr(self, name) + other[name])
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    @property
+    def effective_branching_factor(self):
+        """Growth in nodes between the last two iterations (or nodes^(1/depth))."""
+        counts = self.iteration_nodes
+        if len(counts) >= 2 and counts[-2]:
+            return counts[-1] / counts[-2]
+        if self.depth and self.nodes:
+            return self.nodes ** (1.0 / self.depth)
+        return 0.0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def to_dict(self):
+        """Flat dict for export to a metrics pipeline."""
+        return {
+            "nodes": self.nodes,
+            "leaf_evals": self.leaf_evals,
+            "interior_nodes": self.interior_nodes,
+            "beta_cutoffs": self.beta_cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate,
+            "effective_branching_factor": self.effective_branching_factor,
+            "depth": self.depth,
+            "score": self.score,
+            "iteration_nodes": list(self.iteration_nodes),
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_hit_rate": self.tt_hit_rate,
+            "phase_times": dict(self.phase_times),
+            "source": self.source,
+        }
+
+class EngineState:
+    """
+    AI state kept between moves of the same game, so work done on one move
+    can be reused on the next. Create a new one for every game.
+    """
+    def __init__(self, tt_size=None):
+        self.tt = TranspositionTable(tt_size)
+        # Zobrist hash -> (score, move, depth) found by ponder() for
+        # positions after the opponent's likely replies
+        self.ponder_results = {}
+        # Search tree of the MCTS engine, re-rooted on every move
+        self.mcts = None
+        # Endgame solver, whose cache of solved positions lasts the game
+        self.endgame = None
+
+class SearchTimeout(Exception):
+    """Raised inside minimax when the search runs out of its time/node budget."""
+
+class SearchState:
+    """
+    The single position a search works on. Moves are applied in place with
+    make() and taken back with unmake(), keeping the bitboard, the
+    incremental evaluator, the set of empty cells and the Zobrist hash in
+    sync, so no board is copied per node.
+
+    It also carries the move-ordering tables (principal variation, killer
+    moves, history scores) and the budget that iterative deepening shares
+    between iterations. After a SearchTimeout the position is left
+    mid-search and the state should be discarded.
+
+    With a 'candidate_radius' k, only empty cells within k steps of a stone
+    are searched (see candidate_moves). Setting 'stop_event' (a
+    threading.Event) aborts the search like an exhausted budget. With a
+    SearchStats in 'stats', minimax also counts leaves and cutoffs.
+
+    While the board holds at most config.SYMMETRY_MAX_STONES stones, the
+    hashes of all 12 symmetric images are kept too, and positions are
+    cached under the smallest of them (see cache_key).
+    """
+    def __init__(self, board, tt=None, candidate_radius=None, stop_event=None, stats=None):
+        self.board = board.copy()
+        self.masks = self.board.masks
+        self.evaluator = create_evaluator(self.board)
+        self.empty = set(self.board.empty_cells())
+        zobrist = transposition.get_zobrist(self.board.layout)
+        self.zobrist = zobrist.keys
+        self.hash = zobrist.hash_board(self.board)
+        self.tt = tt
+
+        self.stones = popcount(self.board.occupied)
+        self.symmetry = None
+        self.sym_limit = config.SYMMETRY_MAX_STONES
+        if self.sym_limit and self.stones <= self.sym_limit:
+            self.symmetry = symmetry.get_symmetry(self.board.layout)
+            self.sym_keys = self.symmetry.zobrist_keys
+            self.sym_hashes = [_hash_masks(self.masks, keys) for keys in self.sym_keys]
+
+        # Stack of "cells near a stone" masks, one entry per move made
+        self.neighbourhood = None
+        if candidate_radius:
+            self.neighbourhood = self.board.layout.neighbourhood_masks(candidate_radius)
+            near = 0
+            for index in iter_bits(self.board.occupied):
+                near |= self.neighbourhood[index]
+            self.near_stack = [near]
+
+        size = self.board.layout.size
+        self.pv = []
+        self.follow_pv = False
+        self.killers = [[None, None] for _ in range(size + 1)]
+        self.history = {config.HUMAN_PLAYER: [0] * size, config.AI_PLAYER: [0] * size}
+
+        self.nodes = 0
+        self.deadline = None
+        self.node_limit = None
+        self.stop_event = stop_event
+        self.stats = stats
+        self.next_check = BUDGET_CHECK_INTERVAL if stop_event is not None else math.inf
+
+    def make(self, index, player):
+        self.masks[player] |= 1 << index
+        self.evaluator.place(index, player)
+        self.empty.remove(index)
+        self.hash ^= self.zobrist[player][index]
+        if self.neighbourhood is not None:
+            self.near_stack.append(self.near_stack[-1] | self.neighbourhood[index])
+        if self.symmetry is not None and self.stones < self.sym_limit:
+            hashes = self.sym_hashes
+            for t, keys in enumerate(self.sym_keys):
+                hashes[t] ^= keys[player][index]
+        self.stones += 1
+
+    def unmake(self, index, player):
+        self.masks[player] &= ~(1 << index)
+        self.evaluator.remove(index, player)
+        self.empty.add(index)
+        self.hash ^= self.zobrist[player][index]
+        if self.neighbourhood is not None:
+            self.near_stack.pop()
+        self.stones -= 1
+        if self.symmetry is not None and self.stones < self.sym_limit:
+            hashes = self.sym_hashes
+            for t, keys in enumerate(self.sym_keys):
+                hashes[t] ^= keys[player][index]
+
+    def cache_key(self):
+        """
+        (key, transform) to cache the current position under. Early in the
+        game this is the canonical hash over all symmetries and the
+        transform that maps this position onto it; later it is the plain
+        hash with the identity transform.
+        """
+        if self.symmetry is None or self.stones > self.sym_limit:
+            return self.hash, symmetry.IDENTITY
+        hashes = self.sym_hashes
+        key = min(hashes)
+        return key, hashes.index(key)
+
+    def to_cached_move(self, move, t):
+        if t == symmetry.IDENTITY or move is None:
+            return move
+        return self.symmetry.perms[t][move]
+
+    def from_cached_move(self, move, t):
+        if t == symmetry.IDENTITY or move is None:
+            return move
+        return self.symmetry.inverse[t][move]
+
+    def candidate_moves(self):
+        """
+        Empty cells worth searching. With a candidate radius these are the
+        cells near existing stones; every winning or blocking cell is
+        adjacent to a stone, so no tactic is lost. Falls back to every empty
+        cell when there are no such candidates (e.g. an empty board).
+        """
+        if self.neighbourhood is not None:
+            occupied = self.masks[config.HUMAN_PLAYER] | self.masks[config.AI_PLAYER]
+            candidates = self.near_stack[-1] & ~occupied
+            if candidates:
+                return list(iter_bits(candidates))
+        return list(self.empty)
+
+    # ------------------------------------------------------------------ #
+    #                              BUDGET                                #
+    # ------------------------------------------------------------------ #
+    def set_limits(self, deadline=None, node_limit=None):
+        """Absolute perf_counter() deadline and/or total node count."""
+        self.deadline = deadline
+        self.node_limit = node_limit
+        self.next_check = self.nodes
+
+    def check_limits(self):
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchTimeout()
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchTimeout()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        # Reading the clock is comparatively slow, so only do it every so often
+        self.next_check = self.nodes + BUDGET_CHECK_INTERVAL
+        if self.node_limit is not None:
+            self.next_check = min(self.next_check, self.node_limit)
+
+def _hash_masks(masks, keys):
+    """Zobrist hash of a masks dict with the given per-player keys."""
+    h = 0
+    for player, mask in masks.items():
+        player_keys = keys[player]
+        for index in iter_bits(mask):
+            h ^= player_keys[index]
+    return h
+
+def _order_moves(state, moves, ply, player, tt_move):
+    """
+    Sorts 'moves' in place: PV move, transposition-table move and killer
+    moves first, then the rest by threat potential (the evaluator's gain
+    for the mover), with the history score breaking ties.
+    """
+    history = state.history[player]
+    gain = state.evaluator.gain
+    moves.sort(key=lambda move: (gain(move, player), history[move]), reverse=True)
+    first = []
+    if state.follow_pv and ply < len(state.pv):
+        first.append(state.pv[ply])
+    first.append(tt_move)
+    first.extend(state.killers[ply])
+    front = 0
+    for move in first:
+        if move is not None and move in moves[front:]:
+            moves.remove(move)
+            moves.insert(front, move)
+            front += 1
+
+def _record_cutoff(state, move, ply, player, depth):
+    """Updates killer moves and history after 'move' caused a beta cutoff."""
+    killers = state.killers[ply]
+    if killers[0] != move:
+        killers[1] = killers[0]
+        killers[0] = move
+    state.history[player][move] += depth * depth
+
+def minimax(state, depth, maximizing_player, alpha, beta, last_move=None, ply=0):
+    """
+    Minimax algorithm with alpha-beta pruning over a SearchState.
+    Moves are cell indices into state.board.layout.cells; every child is
+    searched by making the move on the shared state and undoing it after.
+    Results are cached in state.tt (if any) under the position's Zobrist hash.
+    Raises SearchTimeout when the state's budget is exhausted.
+    """
+    state.nodes += 1
+    if state.nodes >= state.next_check:
+        state.check_limits()
+
+    if last_move is not None:
+        # The previous move was made by the player who is *not* to move now
+        mover = config.HUMAN_PLAYER if maximizing_player else config.AI_PLAYER
+        if _is_winning_move(state.board, last_move, mover):
+            return (WIN_SCORE if mover == config.AI_PLAYER else -WIN_SCORE), last_move
+    if not state.empty: # Draw
         return 0, last_move
 
     if depth == 0:
-        return evaluate_board(board), last_move
+        if state.stats is not None:
+            state.stats.leaf_evals += 1
+        return state.evaluator.score, last_move
 
-    valid_moves = [pos for pos, owner in board.items() if owner is None]
-    if not valid_moves:
-        return evaluate_board(board), None # No moves left
+    valid_moves = state.candidate_moves()
+
+    tt = state.tt
+    tt_move = None
+    if tt is not None:
+        key, transform = state.cache_key()
+        entry = tt.probe(key)
+        if entry is not None:
+            _, tt_depth, tt_score, tt_bound, tt_move, _ = entry
+            tt_move = state.from_cached_move(tt_move, transform)
+            if tt_depth >= depth:
+                if tt_bound == EXACT:
+                    return tt_score, tt_move
+                if tt_bound == LOWER:
+                    alpha = max(alpha, tt_score)
+                elif tt_bound == UPPER:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score, tt_move
+        alpha_orig, beta_orig = alpha, beta
+
+    player = config.AI_PLAYER if maximizing_player else config.HUMAN_PLAYER
+    _order_moves(state, valid_moves, ply, player, tt_move)
+    on_pv = state.follow_pv
+    pv_move = state.pv[ply] if on_pv and ply < len(state.pv) else None
+    stats = state.stats
+    if stats is not None:
+        stats.interior_nodes += 1
 
     if maximizing_player:
         max_eval = -math.inf
-        best_move = random.choice(valid_moves)
+        best_move = None
         for move in valid_moves:
-            temp_board = board.copy()
-            temp_board[move] = config.AI_PLAYER
-            evaluation, _ = minimax(temp_board, depth - 1, False, alpha, beta, move) # Pass move
+            state.follow_pv = on_pv and move == pv_move
+            state.make(move, config.AI_PLAYER)
+            evaluation, _ = minimax(state, depth - 1, False, alpha, beta, move, ply + 1)
+            state.unmake(move, config.AI_PLAYER)
             if evaluation > max_eval:
                 max_eval = evaluation
                 best_move = move
             alpha = max(alpha, evaluation)
             if beta <= alpha:
+                _record_cutoff(state, move, ply, player, depth)
+                if stats is not None:
+                    stats.beta_cutoffs += 1
+                    if move == valid_moves[0]:
+                        stats.first_move_cutoffs += 1
                 break
+        state.follow_pv = False
+        if tt is not None:
+            _store(tt, key, depth, max_eval, state.to_cached_move(best_move, transform), alpha_orig, beta_orig)
         return max_eval, best_move
     else: # Minimizing player
         min_eval = math.inf
-        best_move = random.choice(valid_moves)
+        best_move = None
         for move in valid_moves:
-            temp_board = board.copy()
-            temp_board[move] = config.HUMAN_PLAYER
-            evaluation, _ = minimax(temp_board, depth - 1, True, alpha, beta, move) # Pass move
+            state.follow_pv = on_pv and move == pv_move
+            state.make(move, config.HUMAN_PLAYER)
+            evaluation, _ = minimax(state, depth - 1, True, alpha, beta, move, ply + 1)
+            state.unmake(move, config.HUMAN_PLAYER)
             if evaluation < min_eval:
                 min_eval = evaluation
                 best_move = move
             beta = min(beta, evaluation)
             if beta <= alpha:
+                _record_cutoff(state, move, ply, player, depth)
+                if stats is not None:
+                    stats.beta_cutoffs += 1
+                    if move == valid_moves[0]:
+                        stats.first_move_cutoffs += 1
                 break
+        state.follow_pv = False
+        if tt is not None:
+            _store(tt, key, depth, min_eval, state.to_cached_move(best_move, transform), alpha_orig, beta_orig)
         return min_eval, best_move
 
-# You also need to update the initial call in find_best_move
-def find_best_move(game, difficulty_settings):
+def _store(tt, key, depth, score, move, alpha, beta):
+    """Stores a search result with the bound implied by the original window."""
+    if score <= alpha:
+        bound = UPPER
+    elif score >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    tt.store(key, depth, score, bound, move)
+
+def _principal_variation(state, maximizing_player, max_length):
+    """Follows best moves through the transposition table from the current position."""
+    if state.tt is None:
+        return []
+    pv = []
+    player = config.AI_PLAYER if maximizing_player else config.HUMAN_PLAYER
+    while len(pv) < max_length:
+        key, transform = state.cache_key()
+        entry = state.tt.lookup(key)
+        if entry is None:
+            break
+        move = state.from_cached_move(entry[transposition.MOVE], transform)
+        if move not in state.empty:
+            break
+        won = _is_winning_move(state.board, move, player)
+        pv.append(move)
+        state.make(move, player)
+        player = config.HUMAN_PLAYER if player == config.AI_PLAYER else config.AI_PLAYER
+        if won:
+            break
+    for move in reversed(pv):
+        player = config.HUMAN_PLAYER if player == config.AI_PLAYER else config.AI_PLAYER
+        state.unmake(move, player)
+    return pv
+
+def iterative_deepening(state, max_depth, maximizing_player, time_budget=None, node_budget=None,
+                        on_iteration=None):
+    """
+    Searches depth 1, 2, ... up to 'max_depth' until the time budget
+    (seconds) or node budget runs out. Each iteration is seeded with the
+    previous one's principal variation, killers and history. The first
+    iteration always completes unless the state's stop_event is set.
+    'on_iteration(depth, score, move)' is called after every completed one.
+    Returns (score, best_move, depth) from the deepest completed iteration.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget if time_budget else None
+    best = (None, None, 0)
+    max_depth = min(max_depth, len(state.empty))
+    for depth in range(1, max_depth + 1):
+        if depth > 1:
+            # An iteration costs several times the previous one; don't start
+            # one that almost certainly can't finish.
+            if deadline is not None and time.perf_counter() - start > time_budget / 2:
+                break
+            state.set_limits(deadline, node_budget)
+        state.follow_pv = True
+        nodes_before = state.nodes
+        try:
+            score, move = minimax(state, depth, maximizing_player, -math.inf, math.inf, None)
+        except SearchTimeout:
+            break
+        best = (score, move, depth)
+        if state.stats is not None:
+            state.stats.depth = depth
+            state.stats.iteration_nodes.append(state.nodes - nodes_before)
+        state.pv = _principal_variation(state, maximizing_player, depth)
+        if on_iteration is not None:
+            on_iteration(depth, score, move)
+        if abs(score) >= WIN_SCORE:
+            break  # Forced result found, deeper search can't change it
+    return best
+
+def ponder(board, player, difficulty_settings, engine_state, stop_event):
+    """
+    Searches while 'player' (the opponent) is thinking about its move on
+    'board' (a Bitboard snapshot the caller won't touch). The opponent's
+    likeliest replies are tried in move-ordering order, up to
+    config.PONDER_REPLIES, and the engine's answer to each is searched to
+    the full difficulty depth with no time budget. Results land in
+    engine_state: every completed iteration in ponder_results, every node
+    in the shared transposition table. Runs until 'stop_event' is set or
+    the work is done; call find_best_move only after it has returned.
+    """
+    engine_state.ponder_results = {}
+    tt = engine_state.tt
+    tt.new_search()
+    candidate_radius = difficulty_settings.get("candidate_radius")
+    # The engine is the other side; scores stay from the AI's view
+    maximizing = player == config.HUMAN_PLAYER
+    engine = config.AI_PLAYER if maximizing else config.HUMAN_PLAYER
+
+    root = SearchState(board, tt, candidate_radius)
+    replies = root.candidate_moves()
+    key, transform = root.cache_key()
+    entry = tt.lookup(key)
+    tt_move = root.from_cached_move(entry[transposition.MOVE], transform) if entry else None
+    _order_moves(root, replies, 0, player, tt_move)
+
+    for reply in replies[:config.PONDER_REPLIES]:
+        if stop_event.is_set():
+            return
+        if board.is_winning_move(reply, player):
+            continue  # the game would be over; nothing to answer
+        child = board.copy()
+        child.place(reply, player)
+        if child.is_full():
+            continue
+        state = SearchState(child, tt, candidate_radius, stop_event)
+
+        def on_iteration(depth, score, move, key=state.hash):
+            engine_state.ponder_results[key] = (score, move, depth)
+
+        iterative_deepening(state, difficulty_settings["depth"], maximizing, on_iteration=on_iteration)
+
+def find_best_move(game, difficulty_settings, engine_state=None, stop_event=None, progress=None,
+                   stats=None):
     """
     Main entry point for the AI's decision-making process.
-    Accepts a dictionary of difficulty settings.
+    Accepts a dictionary of difficulty settings, and optionally the game's
+    EngineState so the transposition table carries over between moves.
+    Plays for game.current_player, so either side can be engine-driven.
+
+    Safe to run off the UI thread: setting 'stop_event' makes the search
+    return early, and 'progress' is called with a dict (depth, score, move,
+    nodes, pv) after every completed iteration. A SearchStats passed as
+    'stats' is filled with what the move cost.
     """
     valid_moves = game.get_valid_moves()
     if not valid_moves:
         return None
+    started = time.perf_counter()
+
+    def finish(move, source):
+        if stats is not None:
+            stats.source = source
+            stats.phase_times["total"] = time.perf_counter() - started
+        return move
 
     # Heuristic: Check for immediate wins or required blocks first.
     critical_move = _find_immediate_threats(game, valid_moves)
+    if stats is not None:
+        stats.phase_times["threats"] = time.perf_counter() - started
     if critical_move:
-        return critical_move
+        return finish(critical_move, "threat")
 
     # Use the mistake chance from the passed settings
     if random.random() < difficulty_settings["mistake"]:
-        return random.choice(valid_moves)
-    
-    # Use the depth from the passed settings for the full search
-    depth = difficulty_settings["depth"]
-    # The initial call doesn't have a "last_move", so we can pass None
-    _, best_move = minimax(game.board, depth, True, -math.inf, math.inf, None) 
-    
+        return finish(random.choice(valid_moves), "mistake")
+
+    # Opening moves are precomputed; no search needed while in the book
+    if difficulty_settings.get("book"):
+        phase_start = time.perf_counter()
+        book = opening_book.get_book()
+        entry = book.lookup(game.bitboard) if book is not None else None
+        if stats is not None:
+            stats.phase_times["book"] = time.perf_counter() - phase_start
+        if entry is not None and entry[0] in game.bitboard.empty_cells():
+            return finish(game.layout.cells[entry[0]], "book")
+
+    # A win forced by a chain of threats is cheaper to prove than to search for
+    if difficulty_settings.get("threat_nodes"):
+        phase_start = time.perf_counter()
+        solver = threats.ThreatSolver(game.layout, config.THREAT_SEARCH_DEPTH,
+                                      difficulty_settings["threat_nodes"])
+        # Leave most of the move's time budget to the main search
+        time_budget = difficulty_settings.get("time_budget")
+        deadline = phase_start + time_budget / 4 if time_budget else None
+        forced = solver.solve(game.bitboard, game.current_player, deadline, stop_event)
+        if stats is not None:
+            stats.phase_times["threat_search"] = time.perf_counter() - phase_start
+        if forced is not None:
+            return finish(game.layout.cells[forced], "threat_search")
+
+    # Few cells left: solve the position exactly rather than search it. A
+    # lost position falls through to the search, whose heuristic picks the
+    # defence most likely to make the opponent go wrong.
+    endgame_empty = difficulty_settings.get("endgame_empty")
+    if endgame_empty and len(valid_moves) <= endgame_empty:
+        phase_start = time.perf_counter()
+        if engine_state is None:
+            engine_state = EngineState()
+        solver = engine_state.endgame
+        if solver is None or solver.layout is not game.layout:
+            solver = engine_state.endgame = endgame.EndgameSolver(
+                game.layout, config.ENDGAME_NODE_BUDGET, config.ENDGAME_CACHE_SIZE)
+        time_budget = difficulty_settings.get("time_budget")
+        deadline = phase_start + time_budget / 2 if time_budget else None
+        solved = solver.solve(game.bitboard, game.current_player, deadline, stop_event)
+        if stats is not None:
+            stats.phase_times["endgame"] = time.perf_counter() - phase_start
+            stats.nodes += solver.nodes
+        if solved is not None and solved[0] != endgame.LOSS:
+            if stats is not None:
+                score = WIN_SCORE if solved[0] == endgame.WIN else 0
+                stats.score = score if game.current_player == config.AI_PLAYER else -score
+            return finish(game.layout.cells[solved[1]], "endgame")
+
+    # Levels with "engine": "mcts" use the Monte Carlo tree search instead
+    if difficulty_settings.get("engine") == "mcts":
+        phase_start = time.perf_counter()
+        if engine_state is None:
+            engine_state = EngineState()
+        tree = engine_state.mcts
+        if tree is None or tree.layout is not game.layout:
+            tree = engine_state.mcts = mcts.MCTS(game.layout, difficulty_settings.get("candidate_radius"))
+        report = None
+        if progress is not None:
+            def report(info):
+                progress(dict(info, move=game.layout.cells[info["move"]],
+                              pv=[game.layout.cells[m] for m in info["pv"]]))
+        move = mcts.find_move(game.bitboard, game.current_player, difficulty_settings, tree,
+                              stop_event, report, stats)
+        if stats is not None:
+            stats.phase_times["search"] = time.perf_counter() - phase_start
+        if move is None:
+            return finish(random.choice(valid_moves), "mcts")
+        return finish(game.layout.cells[move], "mcts")
+
+    # Pondering may already have searched this position deep enough
+    if engine_state is not None and engine_state.ponder_results:
+        pondered = engine_state.ponder_results.get(game.hash)
+        if pondered is not None:
+            score, move, depth = pondered
+            if (depth >= difficulty_settings["depth"] or abs(score) >= WIN_SCORE) and \
+                    move in game.bitboard.empty_cells():
+                return finish(game.layout.cells[move], "ponder")
+
+    # Scores are always from the AI player's view; X minimises them
+    maximizing = game.current_player == config.AI_PLAYER
+
+    # Deepen up to the configured depth, within the configured budgets
+    phase_start = time.perf_counter()
+    if engine_state is None:
+        engine_state = EngineState()
+    tt = engine_state.tt
+    tt.new_search()
+    tt_hits, tt_misses = tt.hits, tt.misses
+    state = SearchState(game.bitboard, tt, difficulty_settings.get("candidate_radius"),
+                        stop_event, stats)
+
+    on_iteration = None
+    if progress is not None:
+        def on_iteration(depth, score, move):
+            pv = state.pv or [move]
+            progress({"depth": depth, "score": score, "move": game.layout.cells[move],
+                      "nodes": state.nodes, "pv": [game.layout.cells[m] for m in pv]})
+
+    best_move = None
+    workers = parallel_search.resolve_workers(difficulty_settings.get("workers", 1))
+    if workers > 1:
+        # Workers keep tables of their own; hand them the freshest entries
+        # of the game's table, which is where pondering left its work
+        seed = tt.entries(tt.generation - 1, config.PARALLEL_SEED_ENTRIES)
+        result = parallel_search.parallel_root_search(
+            game.bitboard, maximizing, difficulty_settings["depth"], workers,
+            difficulty_settings.get("time_budget"), difficulty_settings.get("node_budget"),
+            difficulty_settings.get("candidate_radius"), stop_event, stats, seed,
+        )
+        if result is not None:
+            score, best_move, depth, state.nodes = result
+            if stats is not None:
+                stats.score = score
+            if on_iteration is not None:
+                on_iteration(depth, score, best_move)
+    if best_move is None:
+        # Single-core search, also the fallback when no process pool is available
+        score, best_move, _ = iterative_deepening(
+            state,
+            difficulty_settings["depth"],
+            maximizing,
+            difficulty_settings.get("time_budget"),
+            difficulty_settings.get("node_budget"),
+            on_iteration,
+        )
+        if stats is not None:
+            stats.score = score
+            stats.nodes += state.nodes
+            stats.tt_hits += tt.hits - tt_hits
+            stats.tt_probes += (tt.hits - tt_hits) + (tt.misses - tt_misses)
+    if stats is not None:
+        stats.phase_times["search"] = time.perf_counter() - phase_start
+
     # Add a fallback just in case minimax returns None
     if best_move is None and valid_moves:
-        return random.choice(valid_moves)
-    
-    return best_move
\ No newline at end of file
+        return finish(random.choice(valid_moves), "search")
+
+    return finish(game.layout.cells[best_move], "search")
@@ -0,0 +1,215 @@
+# arena.py
+# Headless engine-vs-engine matches across a process pool.
+#
+#   python arena.py --engine-a Hard --engine-b "Hard:depth=4,candidate_radius=1" \
+#                   --pairs 500 --workers 8 --out match.jsonl --records match.hxr
+#
+# Games are played in pairs from the same (seeded, random) opening with the
+# colours swapped, so neither engine profits from moving first.
+
+import argparse
+import ast
+import json
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ai
+import config
+from game_logic import HexaTacGame
+from records import RecordWriter
+
+
+def parse_engine(spec):
+    """
+    "Hard" or "Hard:depth=4,time_budget=0.2" -> a settings dict based on
+    config.DIFFICULTY_LEVELS with the given overrides.
+    """
+    name, _, overrides = spec.partition(":")
+    if name not in config.DIFFICULTY_LEVELS:
+        raise ValueError(f"unknown difficulty {name!r}")
+    settings = dict(config.DIFFICULTY_LEVELS[name])
+    for item in filter(None, overrides.split(",")):
+        key, _, value = item.partition("=")
+        try:
+            settings[key.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            settings[key.strip()] = value.strip()
+    # Parallelism comes from running many games at once, not inside an engine
+    settings["workers"] = 1
+    return settings
+
+
+def play_game(settings_x, settings_o, seed, random_plies=0, radius=None, winning_length=None):
+    """
+    Plays one game (on the default board unless 'radius'/'winning_length'
+    are given); X moves first. The first 'random_plies' moves are
+    random (seeded), then each side asks find_best_move with its settings.
+    Returns a result dict with the winner, the moves, per-side timing and
+    per-move seconds and search scores (None where nothing was searched).
+    """
+    rng = random.Random(seed)
+    random.seed(seed)  # the engines' mistake rolls
+    game = HexaTacGame(radius, winning_length)
+    engines = {
+        config.HUMAN_PLAYER: (settings_x, ai.EngineState()),
+        config.AI_PLAYER: (settings_o, ai.EngineState()),
+    }
+    think = {config.HUMAN_PLAYER: 0.0, config.AI_PLAYER: 0.0}
+    searched = {config.HUMAN_PLAYER: 0, config.AI_PLAYER: 0}
+    moves = []
+    move_times = []
+    evals = []
+    while not game.is_game_over:
+        player = game.current_player
+        if len(moves) < random_plies:
+            move = rng.choice(game.get_valid_moves())
+            elapsed, score = 0.0, None
+        else:
+            settings, engine_state = engines[player]
+            stats = ai.SearchStats()
+            start = time.perf_counter()
+            move = ai.find_best_move(game, settings, engine_state, stats=stats)
+            elapsed = time.perf_counter() - start
+            score = stats.score
+            think[player] += elapsed
+            searched[player] += 1
+        game.make_move(*move)
+        moves.append(move)
+        move_times.append(elapsed)
+        evals.append(score)
+    return {
+        "seed": seed,
+        "winner": game.winner,
+        "moves": moves,
+        "move_times": move_times,
+        "evals": evals,
+        "time": think,
+        "engine_moves": searched,
+    }
+
+
+def _play(pair, swapped, spec_a, spec_b, base_seed, random_plies, radius=None, winning_length=None):
+    """Worker: one game of a pair; engine A is X unless 'swapped'."""
+    a, b = parse_engine(spec_a), parse_engine(spec_b)
+    settings_x, settings_o = (b, a) if swapped else (a, b)
+    result = play_game(settings_x, settings_o, base_seed + pair, random_plies, radius, winning_length)
+    a_side = config.AI_PLAYER if swapped else config.HUMAN_PLAYER
+    b_side = config.HUMAN_PLAYER if swapped else config.AI_PLAYER
+    if result["winner"] == "Draw":
+        score = 0.5
+    else:
+        score = 1.0 if result["winner"] == a_side else 0.0
+    result.update({
+        "pair": pair,
+        "a_plays": a_side,
+        "score_a": score,
+        "time_a": result["time"][a_side], "moves_a": result["engine_moves"][a_side],
+        "time_b": result["time"][b_side], "moves_b": result["engine_moves"][b_side],
+    })
+    del result["time"], result["engine_moves"]
+    return result
+
+
+# ---------------------------------------------------------------------- #
+#                               STATISTICS                               #
+# ---------------------------------------------------------------------- #
+def elo_difference(score):
+    """Elo difference implied by an expected score in (0, 1)."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def summarize(results):
+    """W/D/L, Elo difference of A over B with a 95% interval, and time per move."""
+    n = len(results)
+    wins = sum(1 for r in results if r["score_a"] == 1.0)
+    draws = sum(1 for r in results if r["score_a"] == 0.5)
+    losses = n - wins - draws
+    mean = sum(r["score_a"] for r in results) / n if n else 0.5
+    variance = sum((r["score_a"] - mean) ** 2 for r in results) / n if n else 0.0
+    margin = 1.96 * math.sqrt(variance / n) if n else 0.0
+    moves_a = sum(r["moves_a"] for r in results)
+    moves_b = sum(r["moves_b"] for r in results)
+    return {
+        "games": n,
+        "wins": wins, "draws": draws, "losses": losses,
+        "score": mean,
+        "elo": elo_difference(mean),
+        "elo_low": elo_difference(mean - margin),
+        "elo_high": elo_difference(mean + margin),
+        "ms_per_move_a": 1000 * sum(r["time_a"] for r in results) / moves_a if moves_a else 0.0,
+        "ms_per_move_b": 1000 * sum(r["time_b"] for r in results) / moves_b if moves_b else 0.0,
+    }
+
+
+def format_summary(summary):
+    return (
+        f"games {summary['games']}  +{summary['wins']} ={summary['draws']} -{summary['losses']}  "
+        f"score {summary['score']:.3f}  "
+        f"Elo {summary['elo']:+.1f} [{summary['elo_low']:+.1f}, {summary['elo_high']:+.1f}]  "
+        f"ms/move A {summary['ms_per_move_a']:.1f}  B {summary['ms_per_move_b']:.1f}"
+    )
+
+
+def run_match(spec_a, spec_b, pairs, workers=None, seed=0, random_plies=2, out_path=None,
+              report_every=100, radius=None, winning_length=None, records_path=None):
+    """
+    Plays 'pairs' colour-swapped game pairs and returns the summary. Games
+    are also appended to the record file 'records_path' if given.
+    """
+    parse_engine(spec_a), parse_engine(spec_b)  # fail fast on bad specs
+    results = []
+    out = open(out_path, "a") if out_path else None
+    recorder = RecordWriter(records_path, radius, winning_length) if records_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_play, pair, swapped, spec_a, spec_b, seed, random_plies, radius, winning_length)
+                for pair in range(pairs) for swapped in (False, True)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if out:
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+                if recorder:
+                    recorder.write(result["moves"], result["winner"], result["evals"], result["move_times"])
+                if report_every and len(results) % report_every == 0:
+                    print(format_summary(summarize(results)), flush=True)
+    finally:
+        if out:
+            out.close()
+        if recorder:
+            recorder.close()
+    return summarize(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play engine-vs-engine HexaTac matches.")
+    parser.add_argument("--engine-a", default="Hard", help='e.g. "Hard" or "Hard:depth=4,mistake=0"')
+    parser.add_argument("--engine-b", default="Medium")
+    parser.add_argument("--pairs", type=int, default=50, help="game pairs (colours swapped)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--random-plies", type=int, default=2, help="random opening moves per pair")
+    parser.add_argument("--out", default=None, help="append per-game results (JSON lines)")
+    parser.add_argument("--records", default=None, help="append games to this record file (see records.py)")
+    parser.add_argument("--radius", type=int, default=None, help="board radius (default: config.HEX_RADIUS)")
+    parser.add_argument("--winning-length", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    summary = run_match(args.engine_a, args.engine_b, args.pairs, args.workers, args.seed,
+                        args.random_plies, args.out, radius=args.radius,
+                        winning_length=args.winning_length, records_path=args.records)
+    print(format_summary(summary))
+    print(f"{summary['games']} games in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
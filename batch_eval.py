@@ -0,0 +1,168 @@
+# batch_eval.py
+# Scores many boards at once with NumPy (optional; falls back to pure Python).
+#
+# Boards are encoded as int8 rows (+1 AI, -1 human, 0 empty). The window
+# index is a (num_windows, WINNING_LENGTH) gather matrix, so a whole batch is
+# scored with one gather, two vectorised counts and a lookup into the
+# evaluate_sequence weight table.
+
+import argparse
+import random
+import sys
+
+import config
+import ai
+from bitboard import Bitboard, get_layout
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+HAS_NUMPY = np is not None
+
+
+class BatchEvaluator:
+    """
+    Vectorised evaluate_board for batches of Bitboards sharing one layout.
+    evaluate_batch/evaluate_children work with or without NumPy; the
+    encode/score_encoded building blocks need it.
+    """
+    def __init__(self, layout, scores=None):
+        self.layout = layout
+        if scores is None:
+            scores = ai._window_scores(layout.winning_length)
+        self.scores = scores
+        if HAS_NUMPY:
+            self.gather = np.array(layout.window_cells, dtype=np.intp).reshape(-1, layout.winning_length)
+            # Weights loaded from a file may be fractional; only then go float
+            integral = all(isinstance(value, int) for row in scores for value in row)
+            self.lut = np.array(scores, dtype=np.int64 if integral else np.float64)
+            self._bytes = (layout.size + 7) // 8
+
+    # ------------------------------------------------------------------ #
+    #                             ENCODING                               #
+    # ------------------------------------------------------------------ #
+    def _mask_bits(self, mask):
+        raw = np.frombuffer(mask.to_bytes(self._bytes, "little"), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder="little")[:self.layout.size].astype(np.int8)
+
+    def encode(self, board):
+        """One board as an int8 vector of length layout.size."""
+        return (self._mask_bits(board.masks[config.AI_PLAYER])
+                - self._mask_bits(board.masks[config.HUMAN_PLAYER]))
+
+    def _masks_bits(self, masks):
+        raw = b"".join(mask.to_bytes(self._bytes, "little") for mask in masks)
+        rows = np.frombuffer(raw, dtype=np.uint8).reshape(len(masks), self._bytes)
+        return np.unpackbits(rows, axis=1, bitorder="little")[:, :self.layout.size].astype(np.int8)
+
+    def encode_batch(self, boards):
+        """A (len(boards), layout.size) int8 matrix."""
+        return (self._masks_bits([board.masks[config.AI_PLAYER] for board in boards])
+                - self._masks_bits([board.masks[config.HUMAN_PLAYER] for board in boards]))
+
+    # ------------------------------------------------------------------ #
+    #                             SCORING                                #
+    # ------------------------------------------------------------------ #
+    def score_encoded(self, encoded):
+        """Scores an encoded (batch, cells) matrix; returns an int64 (or float64) array."""
+        windows = encoded[:, self.gather]                  # (batch, windows, length)
+        ai_counts = (windows == 1).sum(axis=2)
+        human_counts = (windows == -1).sum(axis=2)
+        return self.lut[ai_counts, human_counts].sum(axis=1)
+
+    def evaluate_batch(self, boards):
+        """evaluate_board for every board in 'boards', as a list of ints."""
+        if not boards:
+            return []
+        if not HAS_NUMPY:
+            return [ai.evaluate_board(board) for board in boards]
+        return self.score_encoded(self.encode_batch(boards)).tolist()
+
+    def evaluate_children(self, board, player, moves):
+        """Scores of 'board' after each of 'player's 'moves' (cell indices)."""
+        if not moves:
+            return []
+        if not HAS_NUMPY:
+            scores = []
+            for move in moves:
+                child = board.copy()
+                child.place(move, player)
+                scores.append(ai.evaluate_board(child))
+            return scores
+        encoded = np.repeat(self.encode(board)[None, :], len(moves), axis=0)
+        encoded[np.arange(len(moves)), np.asarray(moves, dtype=np.intp)] = (
+            1 if player == config.AI_PLAYER else -1)
+        return self.score_encoded(encoded).tolist()
+
+
+_evaluators = {}
+
+def get_batch_evaluator(layout):
+    """Shared BatchEvaluator for a layout, scoring with ai's current weights."""
+    key = (layout.radius, layout.winning_length)
+    evaluator = _evaluators.get(key)
+    # ai.load_eval_weights replaces the score tables; follow it
+    if evaluator is None or evaluator.scores is not ai._window_scores(layout.winning_length):
+        evaluator = _evaluators[key] = BatchEvaluator(layout)
+    return evaluator
+
+
+def check(count=500, seed=0):
+    """
+    Compares the NumPy path against ai.evaluate_board on 'count' random
+    boards per layout, and their children. Returns the number of mismatches,
+    or None if NumPy is not installed.
+    """
+    if not HAS_NUMPY:
+        return None
+    rng = random.Random(seed)
+    mismatches = 0
+    # The default board plus a few others, each once
+    layouts = dict.fromkeys([(config.HEX_RADIUS, config.WINNING_LENGTH), (3, 4), (4, 5), (5, 5)])
+    for radius, winning_length in layouts:
+        layout = get_layout(radius, winning_length)
+        evaluator = BatchEvaluator(layout)
+        boards = []
+        for _ in range(count):
+            board = Bitboard(layout)
+            cells = rng.sample(range(layout.size), rng.randint(0, layout.size))
+            for i, cell in enumerate(cells):
+                board.place(cell, config.AI_PLAYER if i % 2 else config.HUMAN_PLAYER)
+            boards.append(board)
+        expected = [ai.evaluate_board(board) for board in boards]
+        mismatches += sum(a != b for a, b in zip(evaluator.evaluate_batch(boards), expected))
+        # Fractional window scores: every window is worth half a point more
+        halves = [[value + 0.5 for value in row] for row in evaluator.scores]
+        shift = 0.5 * len(layout.windows)
+        got = BatchEvaluator(layout, halves).evaluate_batch(boards)
+        mismatches += sum(a != b + shift for a, b in zip(got, expected))
+        for board in boards[:50]:
+            moves = board.empty_cells()
+            for player in (config.AI_PLAYER, config.HUMAN_PLAYER):
+                expected = []
+                for move in moves:
+                    child = board.copy()
+                    child.place(move, player)
+                    expected.append(ai.evaluate_board(child))
+                got = evaluator.evaluate_children(board, player, moves)
+                mismatches += sum(a != b for a, b in zip(got, expected))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the NumPy batch evaluator against ai.evaluate_board.")
+    parser.add_argument("--boards", type=int, default=500, help="random boards per layout")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    mismatches = check(args.boards, args.seed)
+    if mismatches is None:
+        print("NumPy not installed; skipped")
+        return 0
+    print(f"{mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
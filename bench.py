@@ -0,0 +1,299 @@
+# bench.py
+# Search benchmarks over a fixed position corpus, with baseline comparison.
+#
+#   python bench.py --out bench.json
+#   python bench.py --baseline bench.json --threshold 0.10 --metric nodes_per_sec
+#
+# Every metric is a flat "group.name.measure" key in the JSON output. A
+# comparison fails (exit code 1) when a selected metric is worse than the
+# baseline by more than the threshold.
+
+import argparse
+import fnmatch
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import ai
+import config
+from game_logic import HexaTacGame
+from threats import ThreatSolver
+from transposition import TranspositionTable
+
+# Positions from curated games; "solutions" are the moves that force a win
+CORPUS = [
+    {"name": "win_in_3_a", "moves": [(1, -1), (1, 2), (-3, 2), (0, -1), (3, 0), (3, -1), (-1, 2),
+                                      (3, -2), (2, -1), (2, 1), (-1, -1), (0, 1)],
+     "solutions": [(-1, 1)]},
+    {"name": "win_in_2_a", "moves": [(0, 1), (-2, 1), (1, 2), (3, -3), (-1, -1), (-2, 0), (-3, 2)],
+     "solutions": [(-2, 2)]},
+    {"name": "win_in_3_b", "moves": [(1, -2), (1, 0), (-2, 3), (-1, 2), (-3, 2), (-2, 1), (-2, 0)],
+     "solutions": [(-1, 1), (0, 1)]},
+    {"name": "win_in_2_b", "moves": [(3, -1), (2, -2), (2, -3), (3, -2), (-1, 1), (-1, 0), (1, 2),
+                                      (0, 0), (0, -1)],
+     "solutions": [(-2, 0), (1, 0)]},
+    {"name": "win_in_2_c", "moves": [(-2, 2), (2, -2), (1, -3), (0, -2), (-1, 2), (3, 0), (1, -1)],
+     "solutions": [(1, -2)]},
+    {"name": "win_in_2_d", "moves": [(0, -3), (-3, 1), (2, -1), (-1, 1), (-2, 3), (1, 1), (2, 0)],
+     "solutions": [(0, 1)]},
+]
+
+# Random (seeded) quiet positions at increasing fill levels
+FILL_LEVELS = [0.05, 0.15, 0.30, 0.50]
+
+# name -> (use transposition table, candidate radius)
+MODES = {
+    "full_width": (False, None),
+    "tt": (True, None),
+    "tt_local": (True, 2),
+}
+
+# Measures where a smaller number is better; everything else is "higher is better"
+LOWER_IS_BETTER = ("seconds", "peak_kib", "us_per_call", ".nodes")
+
+
+def game_from_moves(moves):
+    game = HexaTacGame()
+    for move in moves:
+        game.make_move(*move)
+    return game
+
+
+def random_position(fill, seed):
+    """Plays random non-winning moves until 'fill' of the board is occupied."""
+    rng = random.Random(seed)
+    game = HexaTacGame()
+    target = int(len(game.board) * fill)
+    moves = []
+    while len(moves) < target:
+        move = rng.choice(game.get_valid_moves())
+        if game.bitboard.is_winning_move(game.layout.index[move], game.current_player):
+            continue
+        game.make_move(*move)
+        moves.append(move)
+    return moves
+
+
+def corpus():
+    positions = [dict(entry) for entry in CORPUS]
+    for fill in FILL_LEVELS:
+        positions.append({"name": f"fill_{int(fill * 100):02d}",
+                          "moves": random_position(fill, seed=int(fill * 1000)),
+                          "solutions": None})
+    return positions
+
+
+def _search(game, mode, depth, on_iteration=None):
+    use_tt, candidate_radius = MODES[mode]
+    state = ai.SearchState(game.bitboard, TranspositionTable() if use_tt else None, candidate_radius)
+    maximizing = game.current_player == config.AI_PLAYER
+    start = time.perf_counter()
+    result = ai.iterative_deepening(state, depth, maximizing, on_iteration=on_iteration)
+    return result, state.nodes, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------- #
+#                               BENCHMARKS                               #
+# ---------------------------------------------------------------------- #
+def bench_search(positions, depths, metrics):
+    """Nodes/sec and time-to-depth per engine mode and depth."""
+    for mode in MODES:
+        for depth in depths:
+            total_nodes = 0
+            total_time = 0.0
+            for position in positions:
+                game = game_from_moves(position["moves"])
+                _, nodes, elapsed = _search(game, mode, depth)
+                total_nodes += nodes
+                total_time += elapsed
+            prefix = f"search.{mode}.d{depth}"
+            metrics[f"{prefix}.nodes"] = total_nodes
+            metrics[f"{prefix}.seconds"] = total_time
+            metrics[f"{prefix}.nodes_per_sec"] = total_nodes / total_time if total_time else 0.0
+
+
+def bench_solutions(positions, depth, metrics):
+    """Time until iterative deepening first settles on a known winning move."""
+    for mode in MODES:
+        for position in positions:
+            if not position["solutions"]:
+                continue
+            game = game_from_moves(position["moves"])
+            solutions = {game.layout.index[move] for move in position["solutions"]}
+            start = time.perf_counter()
+            solved = []
+
+            def on_iteration(d, score, move):
+                if move in solutions and abs(score) >= ai.WIN_SCORE and not solved:
+                    solved.append(time.perf_counter() - start)
+
+            _search(game, mode, depth, on_iteration)
+            prefix = f"solve.{mode}.{position['name']}"
+            metrics[f"{prefix}.seconds"] = solved[0] if solved else None  # not solved
+
+
+def bench_memory(positions, depth, metrics):
+    """Peak traced allocation of one search per mode (tracing slows it down)."""
+    for mode in MODES:
+        peak = 0
+        for position in positions:
+            game = game_from_moves(position["moves"])
+            tracemalloc.start()
+            _search(game, mode, depth)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        metrics[f"memory.{mode}.d{depth}.peak_kib"] = peak / 1024
+
+
+def _per_call(func, args_list, min_time=0.2):
+    """Microseconds per call, repeating the argument list for at least 'min_time'."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for args in args_list:
+            func(*args)
+        calls += len(args_list)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return 1e6 * elapsed / calls
+
+
+def bench_components(positions, metrics):
+    """The hot functions on their own."""
+    games = [game_from_moves(position["moves"]) for position in positions]
+
+    metrics["component.evaluate_board.us_per_call"] = _per_call(
+        ai.evaluate_board, [(game.bitboard,) for game in games])
+
+    evaluators = [(ai.create_evaluator(game.bitboard), game) for game in games]
+
+    def make_unmake(evaluator, game):
+        for index in game.bitboard.empty_cells():
+            evaluator.place(index, config.AI_PLAYER)
+            evaluator.remove(index, config.AI_PLAYER)
+
+    moves = sum(len(game.get_valid_moves()) for game in games)
+    metrics["component.incremental_eval.us_per_call"] = _per_call(
+        make_unmake, evaluators) * len(games) / moves
+
+    metrics["component.find_immediate_threats.us_per_call"] = _per_call(
+        ai._find_immediate_threats, [(game, game.get_valid_moves()) for game in games])
+
+    def solve_threats(game):
+        ThreatSolver(game.layout, config.THREAT_SEARCH_DEPTH, 20000).solve(game.bitboard, game.current_player)
+    metrics["component.threat_solver.us_per_call"] = _per_call(solve_threats, [(game,) for game in games])
+
+    for depth in (2, 3):
+        def run(game, depth=depth):
+            state = ai.SearchState(game.bitboard, None, 2)
+            ai.minimax(state, depth, game.current_player == config.AI_PLAYER, -math.inf, math.inf)
+        metrics[f"component.minimax.d{depth}.us_per_call"] = _per_call(run, [(game,) for game in games])
+
+
+def bench_end_to_end(positions, metrics):
+    """find_best_move latency for each difficulty, single-core and without book/mistakes."""
+    for name, settings in config.DIFFICULTY_LEVELS.items():
+        settings = dict(settings, mistake=0.0, workers=1, book=False)
+        times = []
+        for position in positions:
+            game = game_from_moves(position["moves"])
+            start = time.perf_counter()
+            ai.find_best_move(game, settings, ai.EngineState())
+            times.append(time.perf_counter() - start)
+        times.sort()
+        metrics[f"end_to_end.{name}.mean_seconds"] = sum(times) / len(times)
+        metrics[f"end_to_end.{name}.max_seconds"] = times[-1]
+
+
+# ---------------------------------------------------------------------- #
+#                          BASELINE COMPARISON                           #
+# ---------------------------------------------------------------------- #
+def compare(current, baseline, patterns, threshold):
+    """
+    Returns a list of (metric, baseline, current, change) for selected
+    metrics that regressed by more than 'threshold' (a fraction).
+    """
+    regressions = []
+    for name, old in baseline.items():
+        if name not in current or not any(fnmatch.fnmatch(name, f"*{p}*") for p in patterns):
+            continue
+        new = current[name]
+        if not old:
+            continue
+        if new is None:  # e.g. a position that is no longer solved
+            regressions.append((name, old, math.inf, math.inf))
+            continue
+        if name.endswith(LOWER_IS_BETTER):
+            change = (new - old) / old
+        else:
+            change = (old - new) / old
+        if change > threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def run(depths, solve_depth, memory_depth, groups):
+    positions = corpus()
+    metrics = {}
+    if "search" in groups:
+        bench_search(positions, depths, metrics)
+    if "solve" in groups:
+        bench_solutions(positions, solve_depth, metrics)
+    if "memory" in groups:
+        bench_memory(positions, memory_depth, metrics)
+    if "components" in groups:
+        bench_components(positions, metrics)
+    if "end_to_end" in groups:
+        bench_end_to_end(positions, metrics)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "positions": len(positions),
+        },
+        "metrics": metrics,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the HexaTac AI.")
+    parser.add_argument("--depths", default="2,3,4", help="comma-separated search depths")
+    parser.add_argument("--solve-depth", type=int, default=5)
+    parser.add_argument("--memory-depth", type=int, default=3)
+    parser.add_argument("--groups", default="search,solve,memory,components,end_to_end")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--metric", action="append", default=None,
+                        help="metric name pattern to check against the baseline (repeatable)")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed relative regression, e.g. 0.10 for 10%%")
+    args = parser.parse_args(argv)
+
+    depths = [int(d) for d in args.depths.split(",") if d]
+    results = run(depths, args.solve_depth, args.memory_depth, set(args.groups.split(",")))
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(results["metrics"], baseline, args.metric or [""], args.threshold)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.4g} -> {new:.4g} ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
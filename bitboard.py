@@ -0,0 +1,176 @@
+# bitboard.py
+# Compact board representation used by the AI: one integer bitmask per player.
+
+import config
+
+# Axial directions that generate every line exactly once (the other three
+# are their mirror images).
+LINE_DIRECTIONS = [(1, 0), (0, 1), (-1, 1)]
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(mask):
+        return bin(mask).count("1")
+
+
+def iter_bits(mask):
+    """Yields the index of every set bit in 'mask', lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BoardLayout:
+    """
+    Static geometry of a radius-N hexagon: cell <-> bit index mapping and
+    the precomputed line masks used for win checks and evaluation.
+    """
+    def __init__(self, radius, winning_length):
+        self.radius = radius
+        self.winning_length = winning_length
+
+        # Same ordering as HexaTacGame._create_board
+        self.cells = []
+        for q in range(-radius, radius + 1):
+            for r in range(-radius, radius + 1):
+                if abs(-q - r) <= radius:
+                    self.cells.append((q, r))
+        self.index = {cell: i for i, cell in enumerate(self.cells)}
+        self.size = len(self.cells)
+        self.full_mask = (1 << self.size) - 1
+
+        # Every straight window of 'winning_length' cells on the board
+        self.windows = []          # bitmask per window
+        self.window_cells = []     # tuple of cell indices per window
+        self.cell_windows = [[] for _ in range(self.size)]  # window ids per cell
+        for (q, r) in self.cells:
+            for dq, dr in LINE_DIRECTIONS:
+                line = [(q + dq * i, r + dr * i) for i in range(winning_length)]
+                if all(pos in self.index for pos in line):
+                    cells = tuple(self.index[pos] for pos in line)
+                    window_id = len(self.windows)
+                    mask = 0
+                    for i in cells:
+                        mask |= 1 << i
+                        self.cell_windows[i].append(window_id)
+                    self.windows.append(mask)
+                    self.window_cells.append(cells)
+
+        # Window masks through each cell, for O(lines) win tests
+        self.cell_window_masks = [
+            [self.windows[w] for w in ids] for ids in self.cell_windows
+        ]
+
+        self._neighbourhoods = {}
+
+    def neighbourhood_masks(self, distance):
+        """Per cell, the mask of cells within 'distance' hex steps (itself included)."""
+        masks = self._neighbourhoods.get(distance)
+        if masks is None:
+            masks = []
+            for (q, r) in self.cells:
+                mask = 0
+                for i, (qq, rr) in enumerate(self.cells):
+                    dq, dr = qq - q, rr - r
+                    if (abs(dq) + abs(dr) + abs(dq + dr)) // 2 <= distance:
+                        mask |= 1 << i
+                masks.append(mask)
+            self._neighbourhoods[distance] = masks
+        return masks
+
+    def bit(self, cell):
+        """Bitmask of a single (q, r) cell."""
+        return 1 << self.index[cell]
+
+
+_layouts = {}
+
+def get_layout(radius=None, winning_length=None):
+    """Returns the shared BoardLayout for a (radius, winning_length) pair."""
+    if radius is None:
+        radius = config.HEX_RADIUS
+    if winning_length is None:
+        winning_length = config.WINNING_LENGTH
+    key = (radius, winning_length)
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = _layouts[key] = BoardLayout(radius, winning_length)
+    return layout
+
+
+class Bitboard:
+    """A board position stored as one bitmask per player."""
+    __slots__ = ("layout", "masks")
+
+    def __init__(self, layout=None, masks=None):
+        self.layout = layout if layout is not None else get_layout()
+        if masks is None:
+            masks = {config.HUMAN_PLAYER: 0, config.AI_PLAYER: 0}
+        self.masks = masks
+
+    @classmethod
+    def from_dict(cls, board, layout=None):
+        """Builds a Bitboard from a HexaTacGame-style {(q, r): owner} dict."""
+        bitboard = cls(layout)
+        index = bitboard.layout.index
+        for cell, owner in board.items():
+            if owner is not None:
+                bitboard.masks[owner] |= 1 << index[cell]
+        return bitboard
+
+    def to_dict(self):
+        """Inverse of from_dict."""
+        board = {}
+        for i, cell in enumerate(self.layout.cells):
+            board[cell] = self.owner(i)
+        return board
+
+    def copy(self):
+        return Bitboard(self.layout, dict(self.masks))
+
+    # ------------------------------------------------------------------ #
+    #                           CELL ACCESS                              #
+    # ------------------------------------------------------------------ #
+    def place(self, index, player):
+        self.masks[player] |= 1 << index
+
+    def remove(self, index, player):
+        self.masks[player] &= ~(1 << index)
+
+    def owner(self, index):
+        bit = 1 << index
+        for player, mask in self.masks.items():
+            if mask & bit:
+                return player
+        return None
+
+    @property
+    def occupied(self):
+        return self.masks[config.HUMAN_PLAYER] | self.masks[config.AI_PLAYER]
+
+    @property
+    def empty_mask(self):
+        return self.layout.full_mask & ~self.occupied
+
+    def empty_cells(self):
+        """Indices of all empty cells, in board order."""
+        return list(iter_bits(self.empty_mask))
+
+    def is_full(self):
+        return self.occupied == self.layout.full_mask
+
+    # ------------------------------------------------------------------ #
+    #                            WIN TESTS                               #
+    # ------------------------------------------------------------------ #
+    def is_winning_move(self, index, player):
+        """
+        True if 'player' owning cell 'index' completes a line. The cell
+        does not need to be placed yet, so this doubles as a "would win" test.
+        """
+        mask = self.masks[player] | (1 << index)
+        for window in self.layout.cell_window_masks[index]:
+            if mask & window == window:
+                return True
+        return False
@@ -1,20 +1,103 @@
 # config.py
 # This file contains all the configuration settings and constants for the game.
 
+import os
+
 # --- Game Logic ---
 HEX_RADIUS = 3
 WINNING_LENGTH = 4
+# Selectable boards: name -> (radius, tiles in a row to win). A radius-N
+# board has 3N(N+1)+1 tiles (37 for Classic, 271 for Huge).
+BOARD_SIZES = {
+    "Classic": (HEX_RADIUS, WINNING_LENGTH),
+    "Large":   (6, 5),
+    "Huge":    (9, 6),
+}
 AI_PLAYER = 'O'
 HUMAN_PLAYER = 'X'
 
 # --- AI Behavior ---
 # The new structure includes depth and mistake chance for each level.
+# "depth" is the deepest iteration searched; "time_budget" (seconds) and
+# "node_budget" (None = unlimited) stop iterative deepening early.
+# "candidate_radius" limits moves to cells that close to a stone (None = all).
+# "workers" is the number of search processes (None = one per core, 1 = single-core).
+# "book" plays opening moves from config.OPENING_BOOK_PATH when available.
+# "ponder" keeps searching in the background while the human is thinking.
+# "threat_nodes" is the node budget of the forcing-win solver run before
+# the search (0 = off).
+# "endgame_empty": with this many empty cells or fewer the position is
+# solved exactly (see endgame.py) instead of searched (0 = off).
+# "engine": "mcts" replaces the minimax search with Monte Carlo tree search
+# (see mcts.py); it stops on "time_budget" or "iterations" (None = unlimited).
 DIFFICULTY_LEVELS = {
-    "Easy":   {"depth": 2, "mistake": 0.30},
-    "Medium": {"depth": 3, "mistake": 0.15},
-    "Hard":   {"depth": 4, "mistake": 0.05},
+    "Easy":   {"depth": 2, "mistake": 0.30, "time_budget": 0.25, "node_budget": None, "candidate_radius": 2, "workers": 1, "book": False, "ponder": False, "threat_nodes": 0, "endgame_empty": 0},
+    "Medium": {"depth": 3, "mistake": 0.15, "time_budget": 0.5,  "node_budget": None, "candidate_radius": 2, "workers": 1, "book": True,  "ponder": True,  "threat_nodes": 2000, "endgame_empty": 10},
+    "Hard":   {"depth": 6, "mistake": 0.05, "time_budget": 1.5,  "node_budget": None, "candidate_radius": 2, "workers": None, "book": True, "ponder": True,  "threat_nodes": 20000, "endgame_empty": 14},
+    "Monte Carlo": {"engine": "mcts", "mistake": 0.05, "time_budget": 1.5, "iterations": None, "candidate_radius": 2, "workers": None, "book": True, "ponder": False, "threat_nodes": 20000, "endgame_empty": 14},
 }
+# Every setting ai.find_best_move reads, for levels whose preset leaves
+# some out (e.g. "depth" on Monte Carlo, once switched to minimax)
+DEFAULT_SETTINGS = dict(DIFFICULTY_LEVELS["Hard"], engine="minimax", iterations=None)
 AI_THINK_TIME = 0.05 
+# How often (seconds) the GUI checks on a search running in the background
+AI_POLL_INTERVAL = 0.03
+# Max entries in the transposition table kept between moves of a game
+TRANSPOSITION_TABLE_SIZE = 1 << 17
+# Multi-core searches start every worker's table with up to this many of
+# the deepest entries the game's table gained since the last move (from
+# the previous search and pondering)
+PARALLEL_SEED_ENTRIES = 4096
+# Scores of the line patterns ai.evaluate_sequence recognises, for the side
+# being evaluated: a full line, a line one or two tiles short of full (the
+# rest empty), and the opponent's lines one or two tiles short
+EVAL_WEIGHTS = {
+    "line": 100000,
+    "one_short": 1000,
+    "two_short": 50,
+    "opponent_one_short": -5000,
+    "opponent_two_short": -200,
+}
+# Weights fitted by `python tune.py`; when the file exists, ai loads them
+# over EVAL_WEIGHTS at startup
+EVAL_WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_weights.json")
+# Positions with up to this many stones are cached under their canonical
+# form over the board's 12 symmetries (0 disables it)
+SYMMETRY_MAX_STONES = 8
+# Opening book built with `python opening_book.py build`; levels with
+# "book": True play from it while the position is in the book
+OPENING_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+# Longest chain of threats (attacking moves) the forcing-win solver follows
+THREAT_SEARCH_DEPTH = 8
+# Endgame solver: positions examined per move before giving up on an exact
+# result, and solved positions remembered for the rest of the game
+ENDGAME_NODE_BUDGET = 200000
+ENDGAME_CACHE_SIZE = 1 << 20
+# Run the AI as a separate process speaking engine_protocol.py, e.g.
+# [sys.executable, "engine_protocol.py"] or ["taskset", "-c", "2,3", ...]
+# (None = search inside the GUI process)
+ENGINE_COMMAND = None
+# Seconds past its time budget (or a stop) an engine process may take to
+# answer a search before it is taken for hung and killed
+ENGINE_REPLY_GRACE = 5.0
+# Game server (server.py): where it listens, how many sessions it admits,
+# how many searches may be queued or running (None = 4 per worker), the
+# default and longest ai_move deadline (seconds), the largest board radius
+# a session may ask for, the most nodes (MCTS iterations)
+# one search may spend, and the per-game table size and number of games
+# whose caches each search process keeps
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_MAX_SESSIONS = 1000
+SERVER_MAX_PENDING = None
+SERVER_DEADLINE = 10.0
+SERVER_MAX_DEADLINE = 60.0
+SERVER_MAX_RADIUS = 9
+SERVER_NODE_BUDGET = 2000000
+SERVER_TT_SIZE = 1 << 14
+SERVER_CACHED_SESSIONS = 256
+# Pondering searches the AI's answer to this many of the human's likeliest replies
+PONDER_REPLIES = 3
 
 # --- UI / Visual Design ---
 INITIAL_WIDTH = 600
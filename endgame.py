@@ -0,0 +1,159 @@
+# endgame.py
+# Exact win/draw/loss solver for positions with few empty cells left.
+#
+# Once only a handful of cells are empty the whole game tree is small
+# enough to search to the end, so instead of a depth-limited minimax with a
+# heuristic evaluation the position is solved outright, by alpha-beta over
+# the three results. What keeps the tree small:
+#   - win-first ordering: a winning cell is played at once, a single enemy
+#     winning cell must be blocked, and moves that make threats come first,
+#     so a won position usually stops at its first move
+#   - dead lines: a line already holding both colours, or needing more
+#     stones than its owner has moves left, can never be completed; with no
+#     line left for either side the position is a draw, and empty cells
+#     on no live line are all alike, so only one of them is tried
+#   - a cache of solved positions, kept for the whole game since results
+#     are exact
+
+import time
+
+import config
+from bitboard import popcount, iter_bits
+from threats import BudgetExhausted
+
+# Results, from the side to move's view
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+
+class EndgameSolver:
+    """
+    Solves positions on a BoardLayout exactly. 'node_budget' is the most
+    positions examined per solve() call and 'cache_size' the most solved
+    positions remembered between calls (the cache is emptied when full).
+    """
+    def __init__(self, layout, node_budget=200000, cache_size=1 << 20):
+        self.layout = layout
+        self.node_budget = node_budget
+        self.cache_size = cache_size
+        self.length = layout.winning_length
+        self.cache = {}  # (own mask, opponent mask) -> (lower bound, upper bound, move)
+        self.windows = ()
+        self.nodes = 0
+        self.deadline = None
+        self.stop_event = None
+
+    def solve(self, board, player, deadline=None, stop_event=None):
+        """
+        Returns (result, move) for 'player' (to move) on the Bitboard:
+        WIN, DRAW or LOSS with best play, and a cell index that achieves
+        it (None if the board is full or the game already decided). Returns
+        None if the node budget or the perf_counter() 'deadline' runs out,
+        or once 'stop_event' is set.
+        """
+        opponent = config.HUMAN_PLAYER if player == config.AI_PLAYER else config.AI_PLAYER
+        own, opp = board.masks[player], board.masks[opponent]
+        # Lines blocked now stay blocked; only the others are ever scanned
+        self.windows = [w for w in self.layout.windows if not (own & w and opp & w)]
+        self.nodes = 0
+        self.deadline = deadline
+        self.stop_event = stop_event
+        if len(self.cache) > self.cache_size:
+            self.cache.clear()
+        try:
+            return self._solve(own, opp, self.layout.full_mask & ~(own | opp))
+        except BudgetExhausted:
+            return None
+
+    def _solve(self, own, opp, empty, alpha=LOSS, beta=WIN):
+        """
+        (result, move) for the side owning 'own', to move. Alpha-beta over
+        the three results: the result is exact when it falls strictly
+        between alpha and beta, otherwise only a bound.
+        """
+        key = (own, opp)
+        cached = self.cache.get(key)
+        if cached is not None:
+            lower, upper, move = cached
+            if lower == upper or lower >= beta:
+                return lower, move
+            if upper <= alpha:
+                return upper, move
+        self.nodes += 1
+        if self.nodes > self.node_budget:
+            raise BudgetExhausted()
+        if self.nodes % 256 == 0:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise BudgetExhausted()
+            if self.stop_event is not None and self.stop_event.is_set():
+                raise BudgetExhausted()
+
+        # Stones each side still gets to play, the mover first
+        left = popcount(empty)
+        own_left, opp_left = (left + 1) // 2, left // 2
+        near = self.length - 1
+        wins = opp_wins = threats = live = 0
+        for window in self.windows:
+            mine = own & window
+            theirs = opp & window
+            if mine and theirs:
+                continue
+            if not theirs:
+                count = popcount(mine)
+                if self.length - count <= own_left:
+                    live |= window
+                    if count == near:
+                        wins |= window & ~mine
+                    elif count == near - 1:
+                        threats |= window & ~mine
+            if not mine:
+                count = popcount(theirs)
+                if self.length - count <= opp_left:
+                    live |= window
+                    if count == near:
+                        opp_wins |= window & ~theirs
+        if wins:
+            result = WIN, (wins & -wins).bit_length() - 1
+        elif not live:
+            result = DRAW, (empty & -empty).bit_length() - 1 if empty else None
+        elif popcount(opp_wins) > 1:
+            result = LOSS, (opp_wins & -opp_wins).bit_length() - 1
+        else:
+            if opp_wins:
+                moves = opp_wins
+            else:
+                # Cells on no live line are interchangeable: try just one
+                moves = empty & live
+                dead = empty & ~live
+                moves |= dead & -dead
+            return self._search(key, own, opp, empty, moves, threats, alpha, beta)
+        self.cache[key] = (result[0], result[0], result[1])
+        return result
+
+    def _search(self, key, own, opp, empty, moves, threats, alpha, beta):
+        """Tries 'moves', threat-making ones first, and caches what it proved."""
+        ordered = list(iter_bits(moves & threats)) + list(iter_bits(moves & ~threats))
+        best, best_move = LOSS - 1, None
+        floor = alpha
+        for move in ordered:
+            bit = 1 << move
+            result = -self._solve(opp, own | bit, empty & ~bit, -beta, -floor)[0]
+            if result > best:
+                best, best_move = result, move
+                if best > floor:
+                    floor = best
+                    if floor >= beta:
+                        break
+        lower, upper = LOSS, WIN
+        if best <= alpha:
+            upper = best
+        elif best >= beta:
+            lower = best
+        else:
+            lower = upper = best
+        cached = self.cache.get(key)
+        if cached is not None:
+            lower, upper = max(lower, cached[0]), min(upper, cached[1])
+        self.cache[key] = (lower, upper, best_move)
+        return best, best_move
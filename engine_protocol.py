@@ -0,0 +1,499 @@
+# engine_protocol.py
+# Line-based engine protocol over stdin/stdout (in the spirit of UCI), and a
+# client that runs the engine as a subprocess.
+#
+#   python engine_protocol.py
+#
+# Cells are written "q,r". Commands (one per line):
+#
+#   hexatac                          -> id / option lines, then "hexatacok"
+#   isready                          -> "readyok"
+#   newgame [radius R] [length K]    new board and fresh engine caches
+#   setoption name N value V         a difficulty setting (depth, time_budget,
+#                                    engine, ...; see OPTION_LIMITS);
+#                                    "difficulty" loads a preset
+#   position startpos [moves C ...]  the start position plus moves
+#   position packed HEX [moves C ...]  a records.pack_position encoding
+#   go [depth N] [movetime MS] [nodes N]
+#                                    search the side to move; streams
+#                                    "info depth D score S nodes N pv C ..."
+#                                    and ends with "bestmove C" (or "none")
+#   ponder                           search in the background while the
+#                                    opponent (the side to move) thinks
+#   stop                             end the running go (bestmove follows)
+#                                    or ponder
+#   quit
+#
+# Commands that change the position or start a search first finish the
+# one running. Problems are reported as "info string error ..."; a go is
+# always answered with a bestmove, even when its search fails.
+
+import ast
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+import ai
+import config
+import records
+from game_logic import HexaTacGame
+
+NAME = "HexaTac"
+DEFAULT_DIFFICULTY = "Medium"
+
+
+def format_cell(cell):
+    return f"{cell[0]},{cell[1]}"
+
+
+def parse_cell(text):
+    q, r = text.split(",")
+    return int(q), int(r)
+
+
+def parse_value(text):
+    """Option values are Python literals (3, 0.5, None, True); anything else stays a string."""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+class ProtocolError(Exception):
+    """A malformed or impossible command."""
+    pass
+
+
+# Options setoption accepts: name -> (type, lowest, highest, None allowed)
+OPTION_LIMITS = {
+    "depth": (int, 1, None, False),
+    "mistake": (float, 0.0, 1.0, False),
+    "time_budget": (float, 0.001, None, True),
+    "node_budget": (int, 1, None, True),
+    "iterations": (int, 1, None, True),
+    "candidate_radius": (int, 0, None, True),
+    "workers": (int, 1, None, True),
+    "threat_nodes": (int, 0, None, False),
+    "endgame_empty": (int, 0, None, False),
+    "book": (bool, None, None, False),
+    "ponder": (bool, None, None, False),
+    "engine": (str, None, None, False),
+}
+ENGINES = ("minimax", "mcts")
+
+
+def check_option(name, value):
+    """Raises ProtocolError unless 'value' is a valid setting for option 'name'."""
+    if name not in OPTION_LIMITS:
+        raise ProtocolError(f"unknown option {name!r}")
+    kind, low, high, nullable = OPTION_LIMITS[name]
+    if value is None and nullable:
+        return
+    if kind is bool:
+        valid, expected = isinstance(value, bool), "True or False"
+    elif kind is str:
+        valid, expected = value in ENGINES, "one of " + ", ".join(ENGINES)
+    else:
+        number = (int,) if kind is int else (int, float)
+        valid = isinstance(value, number) and not isinstance(value, bool) and value == value
+        valid = valid and (low is None or value >= low) and (high is None or value <= high)
+        expected = "an integer" if kind is int else "a number"
+        if high is not None:
+            expected += f" from {low} to {high}"
+        elif low is not None:
+            expected += f" of at least {low}"
+    if not valid:
+        raise ProtocolError(f"{name} must be {expected}{' or None' if nullable else ''}, not {value!r}")
+
+
+def level_settings(difficulty):
+    """A difficulty preset, completed with every setting it leaves out."""
+    return dict(config.DEFAULT_SETTINGS, **config.DIFFICULTY_LEVELS[difficulty])
+
+
+# ---------------------------------------------------------------------- #
+#                              ENGINE SIDE                               #
+# ---------------------------------------------------------------------- #
+class Engine:
+    """Runs the protocol for one input/output stream pair."""
+    def __init__(self, out=None):
+        self.out = out if out is not None else sys.stdout
+        self.out_lock = threading.Lock()
+        self.settings = level_settings(DEFAULT_DIFFICULTY)
+        self.radius = None
+        self.winning_length = None
+        self.game = HexaTacGame()
+        self.engine_state = ai.EngineState()
+        self.search_thread = None
+        self.stop_event = None
+
+    def send(self, line):
+        with self.out_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def run(self, lines):
+        """Handles commands until "quit" or the end of input."""
+        for line in lines:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == "quit":
+                break
+            try:
+                self.handle(words)
+            except ProtocolError as e:
+                self.send(f"info string error {e}")
+        self.finish_search()
+
+    def handle(self, words):
+        command, args = words[0], words[1:]
+        if command == "hexatac":
+            self.send(f"id name {NAME}")
+            for name, value in sorted(self.settings.items()):
+                self.send(f"option name {name} default {value!r}")
+            self.send("hexatacok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "stop":
+            self.finish_search()
+        elif command == "newgame":
+            self.finish_search()
+            self.new_game(args)
+        elif command == "setoption":
+            self.finish_search()
+            self.set_option(args)
+        elif command == "position":
+            self.finish_search()
+            self.set_position(args)
+        elif command == "go":
+            self.finish_search()
+            self.go(args)
+        elif command == "ponder":
+            self.finish_search()
+            self.start(self._ponder)
+        else:
+            raise ProtocolError(f"unknown command {command!r}")
+
+    # ------------------------------------------------------------------ #
+    #                              COMMANDS                              #
+    # ------------------------------------------------------------------ #
+    def new_game(self, args):
+        options = dict(zip(args[::2], args[1::2]))
+        try:
+            self.radius = int(options["radius"]) if "radius" in options else None
+            self.winning_length = int(options["length"]) if "length" in options else None
+        except ValueError:
+            raise ProtocolError("newgame radius/length must be integers")
+        self.game = HexaTacGame(self.radius, self.winning_length)
+        self.engine_state = ai.EngineState()
+
+    def set_option(self, args):
+        if len(args) < 4 or args[0] != "name" or "value" not in args:
+            raise ProtocolError("usage: setoption name <name> value <value>")
+        split = args.index("value")
+        name = " ".join(args[1:split])
+        value = parse_value(" ".join(args[split + 1:]))
+        if name == "difficulty":
+            if value not in config.DIFFICULTY_LEVELS:
+                raise ProtocolError(f"unknown difficulty {value!r}")
+            self.settings = level_settings(value)
+        else:
+            check_option(name, value)
+            self.settings[name] = value
+
+    def set_position(self, args):
+        if not args:
+            raise ProtocolError("usage: position startpos|packed <hex> [moves ...]")
+        if args[0] == "packed":
+            if len(args) < 2:
+                raise ProtocolError("position packed needs an encoding")
+            try:
+                game = records.unpack_game(bytes.fromhex(args[1]), self.radius, self.winning_length)
+            except ValueError as e:
+                raise ProtocolError(f"bad packed position ({e})")
+            rest = args[2:]
+        elif args[0] == "startpos":
+            # Walk the current game back to where the two move lists part
+            # and play on from there, rather than replaying from scratch
+            game = self.game
+            rest = args[1:]
+        else:
+            raise ProtocolError(f"unknown position type {args[0]!r}")
+        cells = []
+        if rest:
+            if rest[0] != "moves":
+                raise ProtocolError("expected 'moves'")
+            for text in rest[1:]:
+                try:
+                    cells.append(parse_cell(text))
+                except ValueError:
+                    raise ProtocolError(f"bad move {text!r}")
+        previous = list(game.moves)
+        if game is self.game:
+            common = 0
+            while common < min(len(previous), len(cells)) and previous[common] == cells[common]:
+                common += 1
+            while len(game.moves) > common:
+                game.undo_move()
+            cells = cells[common:]
+        for cell in cells:
+            if game.is_game_over or not game.make_move(*cell):
+                if game is self.game:
+                    self._restore(previous)
+                raise ProtocolError(f"illegal move {format_cell(cell)}")
+        self.game = game
+
+    def _restore(self, moves):
+        """Puts the current game back to the start position plus 'moves'."""
+        game = self.game
+        while game.moves and game.moves != moves[:len(game.moves)]:
+            game.undo_move()
+        for cell in moves[len(game.moves):]:
+            game.make_move(*cell)
+
+    def go(self, args):
+        settings = dict(self.settings)
+        options = dict(zip(args[::2], args[1::2]))
+        try:
+            if "depth" in options:
+                settings["depth"] = int(options["depth"])
+            if "movetime" in options:
+                settings["time_budget"] = int(options["movetime"]) / 1000.0
+            if "nodes" in options:
+                settings["node_budget"] = int(options["nodes"])
+                settings["iterations"] = int(options["nodes"])
+        except ValueError:
+            raise ProtocolError("go limits must be integers")
+        if any(int(options[name]) < 1 for name in ("depth", "movetime", "nodes") if name in options):
+            raise ProtocolError("go limits must be positive")
+        self.start(lambda stop_event: self._search(settings, stop_event))
+
+    # ------------------------------------------------------------------ #
+    #                          BACKGROUND WORK                           #
+    # ------------------------------------------------------------------ #
+    def start(self, work):
+        stop_event = threading.Event()
+        self.stop_event = stop_event
+        self.search_thread = threading.Thread(target=work, args=(stop_event,), daemon=True)
+        self.search_thread.start()
+
+    def finish_search(self):
+        """Stops the running go/ponder, if any, and waits for it."""
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+            self.stop_event = None
+
+    def _search(self, settings, stop_event):
+        game = self.game
+
+        def progress(info):
+            pv = " ".join(format_cell(cell) for cell in info.get("pv", [info["move"]]))
+            self.send(f"info depth {info['depth']} score {info['score']} nodes {info['nodes']} pv {pv}")
+
+        # Whatever goes wrong, the go is answered: the client waits for bestmove
+        move = None
+        try:
+            if not game.is_game_over:
+                move = ai.find_best_move(game, settings, self.engine_state, stop_event, progress)
+        except Exception as e:
+            self.send(f"info string error search failed: {type(e).__name__}: {e}")
+        self.send(f"bestmove {format_cell(move) if move else 'none'}")
+
+    def _ponder(self, stop_event):
+        game = self.game
+        try:
+            if not game.is_game_over:
+                ai.ponder(game.bitboard.copy(), game.current_player, self.settings,
+                          self.engine_state, stop_event)
+        except Exception as e:
+            self.send(f"info string error ponder failed: {type(e).__name__}: {e}")
+
+
+def main():
+    Engine().run(sys.stdin)
+    return 0
+
+
+# ---------------------------------------------------------------------- #
+#                              CLIENT SIDE                               #
+# ---------------------------------------------------------------------- #
+class EngineError(Exception):
+    """The engine process died, hung, broke the protocol or reported an error."""
+    pass
+
+
+class EngineClient:
+    """
+    Drives an engine process. 'command' is its argv (default
+    config.ENGINE_COMMAND, else this module run with the current Python);
+    it can wrap the engine, e.g. with taskset to pin it to cores. A
+    process that dies is restarted on the next game.
+    """
+    def __init__(self, command=None):
+        self.command = command or config.ENGINE_COMMAND or [sys.executable, os.path.abspath(__file__)]
+        self.process = None
+        self.lines = None
+        self.time_budget = None
+        self.write_lock = threading.Lock()
+        self.search_lock = threading.Lock()
+
+    def _start(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        universal_newlines=True, bufsize=1)
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process, self.lines), daemon=True).start()
+        self.send("hexatac")
+        self._wait_for("hexatacok")
+
+    @staticmethod
+    def _read(process, lines):
+        for line in process.stdout:
+            lines.put(line.strip())
+        lines.put(None)  # end of output: the process is gone
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def send(self, line):
+        if self.process is None:
+            raise EngineError("engine process is not running")
+        try:
+            with self.write_lock:
+                self.process.stdin.write(line + "\n")
+                self.process.stdin.flush()
+        except (OSError, ValueError):
+            raise EngineError("engine process is not running")
+
+    def _next_line(self, timeout=None):
+        try:
+            line = self.lines.get(timeout=timeout)
+        except queue.Empty:
+            return ""
+        if line is None:
+            raise EngineError("engine process exited")
+        return line
+
+    def _wait_for(self, reply):
+        """Reads up to the line 'reply'; returns the errors the engine reported on the way."""
+        errors = []
+        while True:
+            line = self._next_line()
+            if line == reply:
+                return errors
+            if line.startswith("info string error "):
+                errors.append(line[len("info string error "):])
+
+    def _kill(self):
+        if self.alive():
+            self.process.kill()
+        self.process = None
+
+    def new_game(self, settings, radius=None, winning_length=None):
+        """
+        Starts the engine if needed and sets up a new game with these
+        settings; raises EngineError if the engine rejects any of them.
+        """
+        if not self.alive():
+            self._start()
+        command = "newgame"
+        if radius is not None:
+            command += f" radius {radius}"
+        if winning_length is not None:
+            command += f" length {winning_length}"
+        self.send(command)
+        for name, value in settings.items():
+            self.send(f"setoption name {name} value {value!r}")
+        self.send("isready")
+        errors = self._wait_for("readyok")
+        if errors:
+            raise EngineError("; ".join(errors))
+        self.time_budget = settings.get("time_budget")
+
+    def set_position(self, game):
+        self.send("position packed " + records.pack_game(game).hex())
+
+    def find_best_move(self, game, stop_event=None, progress=None, timeout=None):
+        """
+        Like ai.find_best_move, through the engine: returns a (q, r) cell or
+        None. 'progress' gets the info lines as dicts (depth, score, nodes,
+        pv, move); setting 'stop_event' sends "stop" and the engine answers
+        with its best move so far.
+
+        Raises EngineError if the engine reports an error, dies, or has not
+        answered 'timeout' seconds after the go (default: the game's time
+        budget plus config.ENGINE_REPLY_GRACE, no limit without a budget) or
+        config.ENGINE_REPLY_GRACE seconds after a stop; a hung engine is
+        killed, to be restarted on the next game.
+        """
+        if timeout is None and self.time_budget:
+            timeout = self.time_budget + config.ENGINE_REPLY_GRACE
+        with self.search_lock:
+            self.set_position(game)
+            self.send("go")
+            deadline = time.monotonic() + timeout if timeout is not None else None
+            stopped = False
+            errors = []
+            while True:
+                if stop_event is not None and stop_event.is_set() and not stopped:
+                    self.send("stop")
+                    stopped = True
+                    grace = time.monotonic() + config.ENGINE_REPLY_GRACE
+                    deadline = grace if deadline is None else min(deadline, grace)
+                if deadline is not None and time.monotonic() > deadline:
+                    self._kill()
+                    raise EngineError("engine did not answer in time")
+                line = self._next_line(timeout=0.05)
+                words = line.split()
+                if not words:
+                    continue
+                if words[0] == "bestmove":
+                    if errors:
+                        raise EngineError("; ".join(errors))
+                    return None if words[1] == "none" else parse_cell(words[1])
+                if line.startswith("info string error "):
+                    errors.append(line[len("info string error "):])
+                    continue
+                if words[0] == "info" and progress is not None and "pv" in words:
+                    info = self._parse_info(words)
+                    if info is not None:
+                        progress(info)
+
+    @staticmethod
+    def _parse_info(words):
+        fields = {}
+        i = 1
+        while i + 1 < len(words) and words[i] != "pv":
+            fields[words[i]] = parse_value(words[i + 1])
+            i += 2
+        pv = [parse_cell(text) for text in words[words.index("pv") + 1:]]
+        if not pv or "depth" not in fields:
+            return None
+        return {"depth": fields["depth"], "score": fields.get("score"),
+                "nodes": fields.get("nodes"), "pv": pv, "move": pv[0]}
+
+    def ponder(self, game):
+        """Lets the engine think on 'game' (opponent to move) until the next command."""
+        self.set_position(game)
+        self.send("ponder")
+
+    def stop(self):
+        self.send("stop")
+
+    def close(self):
+        if self.alive():
+            try:
+                self.send("quit")
+                self.process.wait(timeout=2)
+            except (EngineError, subprocess.TimeoutExpired):
+                pass
+        self._kill()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
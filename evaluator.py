@@ -0,0 +1,110 @@
+# evaluator.py
+# Incremental, window-indexed board evaluation for the AI search.
+
+import config
+from bitboard import iter_bits
+
+
+class IncrementalEvaluator:
+    """
+    Keeps per-window stone counts for both players and the total score.
+
+    Placing or removing a stone only touches the windows through that cell
+    (layout.cell_windows), so the score changes by a delta instead of being
+    recomputed from scratch at every leaf.
+
+    'scores' is a table indexed by [ai_count][human_count] giving the value
+    of a single window from the AI's point of view.
+    """
+    def __init__(self, layout, scores):
+        self.layout = layout
+        self.scores = scores
+        self.cell_windows = layout.cell_windows
+        window_count = len(layout.windows)
+        self.ai_counts = [0] * window_count
+        self.human_counts = [0] * window_count
+        self.score = scores[0][0] * window_count
+
+    @classmethod
+    def from_bitboard(cls, board, scores):
+        evaluator = cls(board.layout, scores)
+        evaluator.load(board)
+        return evaluator
+
+    def load(self, board):
+        """Resets the counters to match 'board'."""
+        window_count = len(self.layout.windows)
+        self.ai_counts = [0] * window_count
+        self.human_counts = [0] * window_count
+        self.score = self.scores[0][0] * window_count
+        for index in iter_bits(board.masks[config.AI_PLAYER]):
+            self.place(index, config.AI_PLAYER)
+        for index in iter_bits(board.masks[config.HUMAN_PLAYER]):
+            self.place(index, config.HUMAN_PLAYER)
+
+    # ------------------------------------------------------------------ #
+    #                        MOVE / UNDO UPDATES                         #
+    # ------------------------------------------------------------------ #
+    def place(self, index, player):
+        scores = self.scores
+        ai_counts = self.ai_counts
+        human_counts = self.human_counts
+        delta = 0
+        if player == config.AI_PLAYER:
+            for w in self.cell_windows[index]:
+                a = ai_counts[w]
+                h = human_counts[w]
+                delta += scores[a + 1][h] - scores[a][h]
+                ai_counts[w] = a + 1
+        else:
+            for w in self.cell_windows[index]:
+                a = ai_counts[w]
+                h = human_counts[w]
+                delta += scores[a][h + 1] - scores[a][h]
+                human_counts[w] = h + 1
+        self.score += delta
+
+    def remove(self, index, player):
+        scores = self.scores
+        ai_counts = self.ai_counts
+        human_counts = self.human_counts
+        delta = 0
+        if player == config.AI_PLAYER:
+            for w in self.cell_windows[index]:
+                a = ai_counts[w]
+                h = human_counts[w]
+                delta += scores[a - 1][h] - scores[a][h]
+                ai_counts[w] = a - 1
+        else:
+            for w in self.cell_windows[index]:
+                a = ai_counts[w]
+                h = human_counts[w]
+                delta += scores[a][h - 1] - scores[a][h]
+                human_counts[w] = h - 1
+        self.score += delta
+
+    def gain(self, index, player):
+        """
+        How much placing 'player' on the empty cell 'index' would change the
+        score, from that player's point of view. This measures the cell's
+        threat potential: building on own windows and breaking the opponent's.
+        """
+        scores = self.scores
+        ai_counts = self.ai_counts
+        human_counts = self.human_counts
+        delta = 0
+        if player == config.AI_PLAYER:
+            for w in self.cell_windows[index]:
+                a = ai_counts[w]
+                h = human_counts[w]
+                delta += scores[a + 1][h] - scores[a][h]
+            return delta
+        for w in self.cell_windows[index]:
+            a = ai_counts[w]
+            h = human_counts[w]
+            delta += scores[a][h + 1] - scores[a][h]
+        return -delta
+
+    def evaluate(self):
+        """Current score of the whole board from the AI's point of view."""
+        return self.score
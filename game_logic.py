@@ -2,6 +2,8 @@
 # Core game engine – independent of GUI & AI.
 
 import config
+from bitboard import Bitboard, get_layout
+from transposition import get_zobrist
 
 # Axial directions for a hex grid
 DIRECTIONS = [
@@ -9,16 +11,28 @@ DIRECTIONS = [
     (-1, 0), (0, -1), (1, -1)
 ]
 
+# Empty boards already built, by radius; games copy them instead of
+# rebuilding the hexagon
+_board_templates = {}
+
 
 class HexaTacGame:
-    """Manages the game logic and state."""
-    def __init__(self):
-        self.radius = config.HEX_RADIUS
-        self.board = self._create_board()
-        self.current_player = config.HUMAN_PLAYER
-        self.is_game_over = False
-        self.winner = None
-        self.winning_line = []
+    """
+    Manages the game logic and state. Board radius and the number of tiles
+    in a row needed to win default to config.HEX_RADIUS / config.WINNING_LENGTH.
+
+    Alongside the board it keeps the moves played (self.moves, which
+    undo_move/redo walk), the number of empty cells and the Zobrist hash
+    of the position (self.hash, as transposition.ZobristKeys.hash_board
+    computes it), all updated move by move.
+    """
+    def __init__(self, radius=None, winning_length=None):
+        self.radius = radius if radius is not None else config.HEX_RADIUS
+        self.winning_length = winning_length if winning_length is not None else config.WINNING_LENGTH
+        # Compact mirror of self.board used by the AI (see bitboard.py)
+        self.layout = get_layout(self.radius, self.winning_length)
+        self.zobrist_keys = get_zobrist(self.layout).keys
+        self.reset()
 
     # ------------------------------------------------------------------ #
     #                          BOARD CREATION                            #
@@ -31,13 +45,16 @@ class HexaTacGame:
             |q| ≤ radius, |r| ≤ radius, |s| ≤ radius
         where s = -q - r
         """
-        board = {}
-        for q in range(-self.radius, self.radius + 1):
-            for r in range(-self.radius, self.radius + 1):
-                s = -q - r
-                if abs(s) <= self.radius:
-                    board[(q, r)] = None
-        return board
+        template = _board_templates.get(self.radius)
+        if template is None:
+            template = {}
+            for q in range(-self.radius, self.radius + 1):
+                for r in range(-self.radius, self.radius + 1):
+                    s = -q - r
+                    if abs(s) <= self.radius:
+                        template[(q, r)] = None
+            _board_templates[self.radius] = template
+        return dict(template)
 
     # ------------------------------------------------------------------ #
     #                         MOVE HANDLING                              #
@@ -52,29 +69,70 @@ class HexaTacGame:
             and self.board[(q, r)] is None
             and not self.is_game_over
         ):
-            self.board[(q, r)] = self.current_player
-
-            if self._check_win(q, r):
-                self.is_game_over = True
-                self.winner = self.current_player
-            elif self._is_draw():
-                self.is_game_over = True
-                self.winner = "Draw"
-            else:
-                # switch turns
-                self.current_player = (
-                    config.AI_PLAYER
-                    if self.current_player == config.HUMAN_PLAYER
-                    else config.HUMAN_PLAYER
-                )
+            self._place(q, r)
+            self.redo_stack = []
             return True
         return False
 
+    def undo_move(self):
+        """
+        Takes back the last move and returns its (q, r), or None if no
+        move has been played. The game is never over after an undo, since
+        only the last move can have ended it.
+        """
+        if not self.moves:
+            return None
+        cell = self.moves.pop()
+        player = self.board[cell]
+        index = self.layout.index[cell]
+        self.board[cell] = None
+        self.bitboard.remove(index, player)
+        self.hash ^= self.zobrist_keys[player][index]
+        self.empty_count += 1
+        self.current_player = player
+        self.is_game_over = False
+        self.winner = None
+        self.winning_line = []
+        self.redo_stack.append(cell)
+        return cell
+
+    def redo(self):
+        """Replays the last undone move and returns its (q, r), or None if there is none."""
+        if not self.redo_stack:
+            return None
+        cell = self.redo_stack.pop()
+        self._place(*cell)
+        return cell
+
+    def _place(self, q, r):
+        """Plays a legal move for the current player and updates the game state."""
+        player = self.current_player
+        index = self.layout.index[(q, r)]
+        self.board[(q, r)] = player
+        self.bitboard.place(index, player)
+        self.hash ^= self.zobrist_keys[player][index]
+        self.empty_count -= 1
+        self.moves.append((q, r))
+
+        if self._check_win(q, r):
+            self.is_game_over = True
+            self.winner = player
+        elif self._is_draw():
+            self.is_game_over = True
+            self.winner = "Draw"
+        else:
+            # switch turns
+            self.current_player = (
+                config.AI_PLAYER
+                if self.current_player == config.HUMAN_PLAYER
+                else config.HUMAN_PLAYER
+            )
+
     # ------------------------------------------------------------------ #
     #                       WIN / DRAW DETECTION                         #
     # ------------------------------------------------------------------ #
     def _check_win(self, q, r):
-        """Returns True if the last move completed a 4-in-a-row line."""
+        """Returns True if the last move completed a winning_length-in-a-row line."""
         player = self.board.get((q, r))
         if not player:
             return False
@@ -83,7 +141,7 @@ class HexaTacGame:
             line = [(q, r)]
 
             # forward direction
-            for i in range(1, config.WINNING_LENGTH):
+            for i in range(1, self.winning_length):
                 qq, rr = q + dq * i, r + dr * i
                 if self.board.get((qq, rr)) == player:
                     line.append((qq, rr))
@@ -91,20 +149,20 @@ class HexaTacGame:
                     break
 
             # backward direction
-            for i in range(1, config.WINNING_LENGTH):
+            for i in range(1, self.winning_length):
                 qq, rr = q - dq * i, r - dr * i
                 if self.board.get((qq, rr)) == player:
                     line.append((qq, rr))
                 else:
                     break
 
-            if len(line) >= config.WINNING_LENGTH:
-                self.winning_line = line[:config.WINNING_LENGTH]
+            if len(line) >= self.winning_length:
+                self.winning_line = line[:self.winning_length]
                 return True
         return False
 
     def _is_draw(self):
-        return all(v is not None for v in self.board.values())
+        return self.empty_count == 0
 
     # ------------------------------------------------------------------ #
     #                         PUBLIC HELPERS                             #
@@ -114,4 +172,14 @@ class HexaTacGame:
         return [pos for pos, owner in self.board.items() if owner is None]
 
     def reset(self):
-        self.__init__()
+        """Back to the empty board, keeping the size; clears the move history."""
+        self.board = self._create_board()
+        self.bitboard = Bitboard(self.layout)
+        self.current_player = config.HUMAN_PLAYER
+        self.is_game_over = False
+        self.winner = None
+        self.winning_line = []
+        self.moves = []
+        self.redo_stack = []
+        self.empty_count = len(self.board)
+        self.hash = 0
@@ -4,10 +4,17 @@
 
 import tkinter as tk
 import math
+import queue
 import random
+import threading
 import config
 from game_logic import HexaTacGame
 import ai
+from engine_protocol import EngineClient, EngineError
+
+# Corners of a unit hexagon; scaled by the tile size and offset by the tile
+# centre when placing a polygon, so no trig runs while drawing.
+HEX_CORNERS = [(math.cos(math.pi / 180 * (60 * i)), math.sin(math.pi / 180 * (60 * i))) for i in range(6)]
 
 class HexaTacApp(tk.Tk):
     """The main application window that manages different frames."""
@@ -20,6 +27,7 @@ class HexaTacApp(tk.Tk):
         self.configure(bg=config.BG_COLOR)
 
         self.current_difficulty_name = "Medium"
+        self.current_board_size = "Classic"
 
         # --- Store custom colors at the app level ---
         self.player_color = tk.StringVar(value=config.PLAYER_X_COLOR)
@@ -35,6 +43,7 @@ class HexaTacApp(tk.Tk):
         container.grid_rowconfigure(0, weight=1)
         container.grid_columnconfigure(0, weight=1)
 
+        self.current_page = None
         self.frames = {}
         # --- NEW: Added ColorSelectorMenu to the frame list ---
         for F in (MainMenu, GameScreen, ColorSelectorMenu):
@@ -43,24 +52,20 @@ class HexaTacApp(tk.Tk):
             self.frames[page_name] = frame
             frame.grid(row=0, column=0, sticky="nsew")
 
-        self.bind("<Configure>", self.on_app_resize)
-
         self.show_frame("MainMenu")
 
-    def on_app_resize(self, event=None):
-        """When the main window resizes, tell the active GameScreen to update itself."""
-        game_frame = self.frames["GameScreen"]
-        if game_frame.winfo_viewable():
-            game_frame.on_resize()
-
     def show_frame(self, page_name):
         """Raises the selected frame to the top."""
+        if page_name != "GameScreen":
+            # Leaving the game: stop any search still running for it
+            self.frames["GameScreen"].cancel_ai_search()
         if page_name == "GameScreen":
             game_frame = self.frames["GameScreen"]
-            game_frame.start_new_game(self.current_difficulty_name)
+            game_frame.start_new_game(self.current_difficulty_name, self.current_board_size)
         
         frame = self.frames[page_name]
         frame.tkraise()
+        self.current_page = page_name
 
 class MainMenu(tk.Frame):
     """The main menu screen."""
@@ -69,6 +74,7 @@ class MainMenu(tk.Frame):
         self.controller = controller
         
         self.difficulty_var = tk.StringVar(value="Medium")
+        self.board_size_var = tk.StringVar(value="Classic")
 
         title_label = tk.Label(self, text="HexaTac", font=config.TITLE_FONT, bg=config.BG_COLOR, fg=config.TEXT_COLOR)
         title_label.pack(side="top", pady=(80, 20))
@@ -89,8 +95,23 @@ class MainMenu(tk.Frame):
                                 borderwidth=2, relief=tk.RAISED, padx=20, pady=10)
             rb.pack(fill="x", pady=5)
 
+        board_frame = tk.Frame(self, bg=config.BG_COLOR)
+        board_frame.pack(pady=10)
+
+        tk.Label(board_frame, text="Board Size:", font=config.STATUS_FONT, bg=config.BG_COLOR, fg=config.TEXT_COLOR).pack()
+
+        sizes_frame = tk.Frame(board_frame, bg=config.BG_COLOR)
+        sizes_frame.pack()
+        for name, (radius, winning_length) in config.BOARD_SIZES.items():
+            rb = tk.Radiobutton(sizes_frame, text=f"{name} ({winning_length} in a row)", variable=self.board_size_var,
+                                value=name, font=config.STATUS_FONT, bg=config.BG_COLOR, fg=config.TEXT_COLOR,
+                                selectcolor=config.BUTTON_BG_COLOR, activebackground=config.BG_COLOR,
+                                activeforeground=config.TEXT_COLOR, indicatoron=False,
+                                borderwidth=2, relief=tk.RAISED, padx=10, pady=5)
+            rb.pack(side="left", padx=5, pady=5)
+
         button_frame = tk.Frame(self, bg=config.BG_COLOR)
-        button_frame.pack(pady=40)
+        button_frame.pack(pady=30)
 
         play_button = tk.Button(button_frame, text="Play Game", font=config.BUTTON_FONT,
                                 command=self.play_game,
@@ -106,8 +127,9 @@ class MainMenu(tk.Frame):
         color_button.pack(pady=10)
 
     def play_game(self):
-        """Stores the selected difficulty and switches to the game screen."""
+        """Stores the selected difficulty and board size and switches to the game screen."""
         self.controller.current_difficulty_name = self.difficulty_var.get()
+        self.controller.current_board_size = self.board_size_var.get()
         self.controller.show_frame("GameScreen")
 
 class ColorSelectorMenu(tk.Frame):
@@ -187,11 +209,26 @@ class GameScreen(tk.Frame):
         super().__init__(parent, bg=config.BG_COLOR)
         self.controller = controller
         self.game = None
+        self.engine_state = None # AI caches kept for the current game
         self.difficulty_settings = None # This will hold the dict e.g. {"depth": 3, "mistake": 0.15}
         self.difficulty_name = None
         self.tile_size = 0 
         self.end_game_overlay = None
         self.after_id = None # To manage the scheduled AI turn
+        self.ai_stop_event = None # Set to cancel the search running in the background
+        self.ai_queue = None # Messages from the search thread, polled on the Tk thread
+        self.poll_id = None
+        self.ponder_stop_event = None # Set to stop pondering during the human's turn
+        self.ai_thread = None # The running search, kept so a later one can wait for it
+        self.ponder_thread = None # The search must wait for it before using the shared caches
+        self.cancelled_threads = [] # Stopped searches that may still be finishing on the same caches
+        self.engine_client = None # Engine subprocess when config.ENGINE_COMMAND is set
+        self.client_pondering = False
+        self.hex_items = {} # (q, r) -> canvas polygon, kept for the whole game
+        self.tile_fills = {} # (q, r) -> fill colour the polygon currently has
+        self.tiles_radius = None # Board radius the polygons were created for
+        self.layout_key = None # (centre x, centre y, tile size) the polygons are placed for
+        self.resize_id = None # Pending redraw for a burst of <Configure> events
 
         self.status_label = tk.Label(self, text="", fg=config.TEXT_COLOR, bg=config.BG_COLOR, font=config.STATUS_FONT)
         self.status_label.pack(pady=10)
@@ -200,10 +237,14 @@ class GameScreen(tk.Frame):
         self.canvas.pack(fill="both", expand=True, padx=10, pady=10)
 
         self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<Configure>", self.schedule_resize)
+        controller.bind("<Control-z>", self.take_back)
 
-    def start_new_game(self, difficulty_name="Medium"):
+    def start_new_game(self, difficulty_name="Medium", board_size="Classic"):
         """Initializes or resets the game state for a new round."""
-        self.game = HexaTacGame()
+        radius, winning_length = config.BOARD_SIZES[board_size]
+        self.game = HexaTacGame(radius, winning_length)
+        self.engine_state = ai.EngineState()
         self.difficulty_name = difficulty_name
         self.difficulty_settings = config.DIFFICULTY_LEVELS[difficulty_name]
         self.status_label.config(text=f"Your Turn (X) | Difficulty: {difficulty_name}")
@@ -211,24 +252,42 @@ class GameScreen(tk.Frame):
         if self.end_game_overlay:
             self.end_game_overlay.destroy()
             self.end_game_overlay = None
+        self.canvas.delete("overlay")
 
         # Cancel any lingering AI turn from a previous game
         if self.after_id:
             self.after_cancel(self.after_id)
             self.after_id = None
+        self.cancel_ai_search()
+        self.cancelled_threads = [] # They only use the previous game's caches
+
+        if config.ENGINE_COMMAND:
+            if self.engine_client is None:
+                self.engine_client = EngineClient()
+            try:
+                self.engine_client.new_game(self.difficulty_settings, radius, winning_length)
+            except (EngineError, OSError):
+                self.engine_client = None # Fall back to searching in-process
+
+        self.schedule_resize()
 
-        self.after(10, self.on_resize)
+    def schedule_resize(self, event=None):
+        """Coalesces a burst of resize events into a single redraw once Tk is idle."""
+        if self.resize_id is None:
+            self.resize_id = self.after_idle(self.on_resize)
 
     def on_resize(self, event=None):
         """Handles window resizing by scaling the hex grid."""
+        self.resize_id = None
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
 
         if canvas_width <= 1 or canvas_height <= 1:
             return 
 
-        grid_width_in_tiles = (config.HEX_RADIUS * 2 + 1) * 1.5
-        grid_height_in_tiles = (config.HEX_RADIUS * 2 + 1) * math.sqrt(3)
+        radius = self.game.radius if self.game else config.HEX_RADIUS
+        grid_width_in_tiles = (radius * 2 + 1) * 1.5
+        grid_height_in_tiles = (radius * 2 + 1) * math.sqrt(3)
 
         size_from_width = canvas_width / grid_width_in_tiles
         size_from_height = canvas_height / grid_height_in_tiles
@@ -236,6 +295,7 @@ class GameScreen(tk.Frame):
         self.tile_size = min(size_from_width, size_from_height) * 0.9 
         
         self.draw_board()
+        self.canvas.coords("overlay", canvas_width / 2, canvas_height / 2)
         if self.game and self.game.is_game_over and self.end_game_overlay is None:
             self.show_end_game_options()
 
@@ -260,75 +320,213 @@ class GameScreen(tk.Frame):
         elif r_diff > s_diff: r = -q - s
         return int(q), int(r)
 
+    def hex_points(self, q, r, center_x, center_y):
+        """Flat list of the six corner coordinates of a tile."""
+        hex_center_x, hex_center_y = self.hex_to_pixel(q, r, center_x, center_y)
+        size = self.tile_size
+        points = []
+        for dx, dy in HEX_CORNERS:
+            points.append(hex_center_x + size * dx)
+            points.append(hex_center_y + size * dy)
+        return points
+
+    def create_tiles(self):
+        """Creates one polygon per cell; they are moved and recoloured, never recreated."""
+        self.canvas.delete("hex")
+        self.hex_items = {
+            cell: self.canvas.create_polygon(0, 0, 0, 0, 0, 0, fill=config.EMPTY_COLOR,
+                                             outline=config.BORDER_COLOR, width=2, tags="hex")
+            for cell in self.game.board
+        }
+        self.tile_fills = {cell: config.EMPTY_COLOR for cell in self.hex_items}
+        self.tiles_radius = self.game.radius
+        self.layout_key = None
+
     def draw_board(self):
+        """Places the tiles for the current canvas size and recolours any that changed."""
         if not self.game:
             return
-        # wipe previous hexes / winning outline
-        self.canvas.delete("hex")
-        self.canvas.delete("win")
+        if self.tiles_radius != self.game.radius:
+            self.create_tiles()
 
         cx, cy = self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2
+        if self.layout_key != (cx, cy, self.tile_size):
+            for (q, r), item in self.hex_items.items():
+                self.canvas.coords(item, *self.hex_points(q, r, cx, cy))
+            self.layout_key = (cx, cy, self.tile_size)
+
+        for cell, owner in self.game.board.items():
+            self.update_tile(cell, owner)
+        self.draw_winning_line(cx, cy)
+
+    def draw_move(self, q, r):
+        """Redraws after a single move: one tile, plus the winning line if it ended the game."""
+        self.update_tile((q, r), self.game.board[(q, r)])
+        if self.game.is_game_over:
+            self.draw_winning_line(self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2)
 
-        # draw every tile
-        for (q, r), owner in self.game.board.items():
-            self.draw_hex(q, r, owner, cx, cy)          # draw_hex now tags="hex"
-
-        # overlay a glowing outline if someone has won
-        if self.game.is_game_over and self.game.winner != "Draw":
-            self.draw_winning_line(cx, cy)              # draw_winning_line tags="win"
-
-
-    def draw_hex(self, q, r, owner, center_x, center_y):
-        """Draws a single hexagon tile on the canvas."""
-        hex_center_x, hex_center_y = self.hex_to_pixel(q, r, center_x, center_y)
-        points = []
-        for i in range(6):
-            angle_rad = math.pi / 180 * (60 * i)
-            points.append((hex_center_x + self.tile_size * math.cos(angle_rad), hex_center_y + self.tile_size * math.sin(angle_rad)))
+    def update_tile(self, cell, owner):
+        """Recolours a tile's polygon if its fill has changed."""
         fill_color = {
             config.HUMAN_PLAYER: self.controller.player_color.get(),
             config.AI_PLAYER: self.controller.ai_color.get()
         }.get(owner, config.EMPTY_COLOR)
-        self.canvas.create_polygon(points, fill=fill_color, outline=config.BORDER_COLOR, width=2, tags="hex")
+        if self.tile_fills.get(cell) != fill_color:
+            self.canvas.itemconfig(self.hex_items[cell], fill=fill_color)
+            self.tile_fills[cell] = fill_color
 
     def draw_winning_line(self, center_x, center_y):
-        """Highlights the winning four-in-a-row."""
+        """Highlights the winning line."""
+        self.canvas.delete("win")
         if not self.game or not self.game.winning_line or not isinstance(self.game.winning_line, list):
             return
 
         for (q, r) in self.game.winning_line:
-            hex_center_x, hex_center_y = self.hex_to_pixel(q, r, center_x, center_y)
-            points = []
-            for i in range(6):
-                angle_rad = math.pi / 180 * (60 * i)
-                points.append((hex_center_x + self.tile_size * math.cos(angle_rad), hex_center_y + self.tile_size * math.sin(angle_rad)))
-            self.canvas.create_polygon(points, fill="", outline=config.WIN_LINE_COLOR, width=4, tags="win")
+            self.canvas.create_polygon(self.hex_points(q, r, center_x, center_y), fill="",
+                                       outline=config.WIN_LINE_COLOR, width=4, tags="win")
 
     def on_canvas_click(self, event):
         """Handles player clicks on the board."""
         if self.game and self.game.current_player == config.HUMAN_PLAYER and not self.game.is_game_over:
             q, r = self.pixel_to_hex(event.x, event.y)
             if self.game.make_move(q, r):
-                self.draw_board()
+                self.stop_ponder()
+                self.draw_move(q, r)
                 self.update_status()
                 if not self.game.is_game_over:
                     self.after_id = self.after(int(config.AI_THINK_TIME * 1000), self.ai_turn)
 
+    def take_back(self, event=None):
+        """Ctrl+Z: undoes moves back to the human's previous turn, stopping any AI search."""
+        if self.controller.current_page != "GameScreen":
+            return
+        if not self.game or self.game.is_game_over or not self.game.moves:
+            return
+        if self.after_id:
+            self.after_cancel(self.after_id)
+            self.after_id = None
+        self.cancel_ai_search()
+        while self.game.undo_move() is not None:
+            if self.game.current_player == config.HUMAN_PLAYER:
+                break
+        self.draw_board()
+        self.update_status()
+
     def ai_turn(self):
-        """Initiates the AI's move and updates the board."""
+        """Starts the AI's search on a worker thread and begins polling for its result."""
         self.after_id = None # Clear the ID as the turn is now running
         if self.game and self.game.current_player == config.AI_PLAYER and not self.game.is_game_over:
             self.status_label.config(text="AI is thinking...")
-            self.update_idletasks()
-            
-            # **FIX:** Pass the entire difficulty_settings dictionary to the AI module.
-            # The AI module will handle the logic for mistakes and depth.
-            best_move = ai.find_best_move(self.game, self.difficulty_settings)
-            
-            # The rest of the function remains the same, but the call above is now correct.
-            if best_move and self.game.make_move(best_move[0], best_move[1]):
-                self.draw_board()
-                self.update_status()
+            self.cancel_ai_search()
+            waits, self.cancelled_threads = self.cancelled_threads, []
+
+            # Each search gets its own event and queue, so a cancelled search
+            # can never deliver its move into a later turn or game.
+            stop_event = threading.Event()
+            results = queue.Queue()
+            self.ai_stop_event = stop_event
+            self.ai_queue = results
+            game, settings, engine_state = self.game, self.difficulty_settings, self.engine_state
+            client = self.engine_client
+
+            def search():
+                progress = lambda info: results.put(("progress", info))
+                # A stopped ponder or search exits within a few hundred
+                # nodes; the caches it shares are then safe to use
+                for thread in waits:
+                    thread.join()
+                if client is not None:
+                    try:
+                        results.put(("done", client.find_best_move(game, stop_event, progress)))
+                        return
+                    except EngineError:
+                        pass # The engine died; this move is searched in-process
+                move = ai.find_best_move(game, settings, engine_state, stop_event, progress=progress)
+                results.put(("done", move))
+
+            self.ai_thread = threading.Thread(target=search, daemon=True)
+            self.ai_thread.start()
+            self.poll_id = self.after(int(config.AI_POLL_INTERVAL * 1000), self.poll_ai)
+
+    def poll_ai(self):
+        """Drains the search thread's queue; plays the move once it arrives."""
+        self.poll_id = None
+        if self.ai_queue is None:
+            return
+        try:
+            while True:
+                kind, payload = self.ai_queue.get_nowait()
+                if kind == "progress":
+                    self.status_label.config(text=f"AI is thinking... (depth {payload['depth']})")
+                elif kind == "done":
+                    self.ai_stop_event = None
+                    self.ai_queue = None
+                    if payload and self.game.make_move(payload[0], payload[1]):
+                        self.draw_move(payload[0], payload[1])
+                        self.update_status()
+                        self.start_ponder()
+                    return
+        except queue.Empty:
+            pass
+        self.poll_id = self.after(int(config.AI_POLL_INTERVAL * 1000), self.poll_ai)
+
+    def start_ponder(self):
+        """Searches the AI's answers to the likeliest human replies while the human thinks."""
+        self.stop_ponder()
+        if not self.difficulty_settings.get("ponder") or self.game.is_game_over:
+            return
+        if self.engine_client is not None:
+            try:
+                self.engine_client.ponder(self.game)
+                self.client_pondering = True
+            except EngineError:
+                pass
+            return
+        stop_event = threading.Event()
+        self.ponder_stop_event = stop_event
+        waits, self.cancelled_threads = self.cancelled_threads, []
+        board, player = self.game.bitboard.copy(), self.game.current_player
+        settings, engine_state = self.difficulty_settings, self.engine_state
+
+        def ponder():
+            for thread in waits:
+                thread.join()
+            ai.ponder(board, player, settings, engine_state, stop_event)
+
+        self.ponder_thread = threading.Thread(target=ponder, daemon=True)
+        self.ponder_thread.start()
+
+    def stop_ponder(self):
+        """Asks the ponder search to stop; the next AI search waits for it to finish."""
+        if self.ponder_stop_event is not None:
+            self.ponder_stop_event.set()
+            self.ponder_stop_event = None
+        if self.client_pondering:
+            self.client_pondering = False
+            try:
+                self.engine_client.stop()
+            except EngineError:
+                pass
+
+    def cancel_ai_search(self):
+        """
+        Stops a running background search and discards its result. The
+        stopped threads are kept in cancelled_threads for the next search
+        to wait on, since they may still be touching the game's caches.
+        """
+        self.stop_ponder()
+        for thread in (self.ponder_thread, self.ai_thread):
+            if thread is not None and thread.is_alive():
+                self.cancelled_threads.append(thread)
+        self.ponder_thread = None
+        self.ai_thread = None
+        if self.ai_stop_event is not None:
+            self.ai_stop_event.set()
+            self.ai_stop_event = None
+        self.ai_queue = None
+        if self.poll_id:
+            self.after_cancel(self.poll_id)
+            self.poll_id = None
 
     def update_status(self):
         """Updates the status label, tracks win streaks, and shows end-game options."""
@@ -374,4 +572,4 @@ class GameScreen(tk.Frame):
                                   bg=config.BUTTON_BG_COLOR, fg=config.TEXT_COLOR, activebackground=config.BUTTON_ACTIVE_BG_COLOR, relief=tk.FLAT, padx=10, pady=5)
         main_menu_btn.pack(side="top", pady=(0,10), padx=20)
 
-        self.canvas.create_window(self.canvas.winfo_width()/2, self.canvas.winfo_height()/2, window=self.end_game_overlay, anchor="center")
+        self.canvas.create_window(self.canvas.winfo_width()/2, self.canvas.winfo_height()/2, window=self.end_game_overlay, anchor="center", tags="overlay")
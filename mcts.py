@@ -0,0 +1,318 @@
+# mcts.py
+# Monte Carlo Tree Search engine, an alternative to the minimax search in ai.py.
+#
+# UCT selection over a tree whose moves are limited to cells near stones,
+# random rollouts played straight on the bitboard masks, and an anytime
+# loop that stops on a time or iteration budget. The tree is kept in the
+# game's EngineState and re-rooted at the next position, and extra cores
+# run independent trees whose root statistics are summed (root parallelism).
+
+import math
+import random
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+import parallel_search
+from bitboard import get_layout, iter_bits, popcount
+
+# UCT exploration constant (sqrt(2) is the textbook value for rewards in [0, 1])
+EXPLORATION = 1.4
+# Iterations between stop_event / clock checks and progress reports
+CHECK_INTERVAL = 64
+PROGRESS_INTERVAL = 2048
+
+
+def _other(player):
+    return config.HUMAN_PLAYER if player == config.AI_PLAYER else config.AI_PLAYER
+
+
+class Node:
+    """
+    One position in the tree, reached by 'player' playing 'move'. 'wins'
+    is the total reward for 'player' (1 win, 0.5 draw) over 'visits'.
+    'winner' is set on terminal nodes: a player, or "Draw".
+    """
+    __slots__ = ("move", "player", "parent", "children", "untried", "near", "visits", "wins", "winner")
+
+    def __init__(self, move, player, parent, near, winner=None):
+        self.move = move
+        self.player = player
+        self.parent = parent
+        self.children = []
+        self.untried = None  # moves not expanded yet, filled on the first visit
+        self.near = near
+        self.visits = 0
+        self.wins = 0.0
+        self.winner = winner
+
+    def best_child(self):
+        """The most visited child; the move to play."""
+        return max(self.children, key=lambda child: child.visits)
+
+
+class MCTS:
+    """
+    A search tree for one game. search() grows it from the given position
+    and returns the chosen move; calling it again on a later position of
+    the same game reuses the subtree that leads there.
+    """
+    def __init__(self, layout, candidate_radius=2, exploration=EXPLORATION, seed=None):
+        self.layout = layout
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.neighbourhood = layout.neighbourhood_masks(candidate_radius) if candidate_radius else None
+        self.root = None
+        self.root_masks = None
+        self.root_player = None
+        self.iterations = 0
+
+    # ------------------------------------------------------------------ #
+    #                             TREE REUSE                             #
+    # ------------------------------------------------------------------ #
+    def set_position(self, masks, player):
+        """
+        Moves the root to the given position: the matching descendant of
+        the old root if the new stones were played inside the tree,
+        otherwise a fresh root.
+        """
+        node = self._find_descendant(masks, player)
+        if node is None:
+            near = 0
+            if self.neighbourhood is not None:
+                for index in iter_bits(masks[config.AI_PLAYER] | masks[config.HUMAN_PLAYER]):
+                    near |= self.neighbourhood[index]
+            node = Node(None, _other(player), None, near)
+        node.parent = None
+        self.root = node
+        self.root_masks = dict(masks)
+        self.root_player = player
+
+    def _find_descendant(self, masks, player):
+        if self.root is None or self.root.winner is not None:
+            return None
+        old = self.root_masks
+        for owner in masks:
+            if old[owner] & ~masks[owner]:
+                return None  # stones disappeared: a different game
+        new_stones = {owner: masks[owner] & ~old[owner] for owner in masks}
+        node = self.root
+        mover = self.root_player
+        for _ in range(sum(popcount(stones) for stones in new_stones.values())):
+            for child in node.children:
+                if new_stones[mover] >> child.move & 1:
+                    node = child
+                    break
+            else:
+                return None
+            mover = _other(mover)
+        if mover != player:
+            return None
+        return node
+
+    # ------------------------------------------------------------------ #
+    #                               SEARCH                               #
+    # ------------------------------------------------------------------ #
+    def search(self, masks, player, time_budget=None, max_iterations=None, stop_event=None,
+               progress=None):
+        """
+        Runs iterations from the position until the time budget (seconds),
+        the iteration budget or 'stop_event' ends it, and returns the most
+        visited move (a cell index), or None if there is no legal move.
+        'progress' is called every PROGRESS_INTERVAL iterations with a dict
+        (depth, score, move, nodes, pv) like the minimax search reports.
+        """
+        self.set_position(masks, player)
+        deadline = time.perf_counter() + time_budget if time_budget else None
+        self.iterations = 0
+        while True:
+            if self.iterations % CHECK_INTERVAL == 0:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+            if max_iterations is not None and self.iterations >= max_iterations:
+                break
+            if not self._iterate():
+                break  # the whole tree is solved or there is nothing to search
+            self.iterations += 1
+            if progress is not None and self.iterations % PROGRESS_INTERVAL == 0:
+                progress(self.summary())
+        if not self.root.children:
+            return None
+        return self.root.best_child().move
+
+    def summary(self):
+        """The most-visited line (pv, depth), its first move's win rate for the root player, and that move."""
+        pv = []
+        node = self.root
+        while node.children:
+            node = node.best_child()
+            pv.append(node.move)
+        best = self.root.best_child() if self.root.children else None
+        return {
+            "depth": len(pv),
+            "score": best.wins / best.visits if best is not None and best.visits else 0.5,
+            "move": best.move if best is not None else None,
+            "nodes": self.iterations,
+            "pv": pv,
+        }
+
+    def root_statistics(self):
+        """{move: (visits, wins)} for the root's children."""
+        return {child.move: (child.visits, child.wins) for child in self.root.children}
+
+    def _iterate(self):
+        """One selection / expansion / rollout / backpropagation pass."""
+        masks = dict(self.root_masks)
+        node = self.root
+        to_move = self.root_player
+        full = self.layout.full_mask
+
+        # Selection: descend through fully expanded nodes
+        while node.winner is None and node.untried is not None and not node.untried and node.children:
+            node = self._select(node)
+            masks[node.player] |= 1 << node.move
+            to_move = _other(node.player)
+
+        # Expansion
+        if node.winner is None:
+            occupied = masks[config.AI_PLAYER] | masks[config.HUMAN_PLAYER]
+            if node.untried is None:
+                candidates = node.near & ~occupied if self.neighbourhood is not None else 0
+                node.untried = list(iter_bits(candidates or full & ~occupied))
+                self.rng.shuffle(node.untried)
+            if not node.untried and not node.children:
+                return False  # no empty cell: nothing left to search
+            if node.untried:
+                move = node.untried.pop()
+                masks[to_move] |= 1 << move
+                winner = None
+                if self._completes_line(masks[to_move], move):
+                    winner = to_move
+                elif occupied | (1 << move) == full:
+                    winner = "Draw"
+                near = node.near | self.neighbourhood[move] if self.neighbourhood is not None else 0
+                child = Node(move, to_move, node, near, winner)
+                node.children.append(child)
+                node = child
+                to_move = _other(to_move)
+
+        # Simulation
+        winner = node.winner
+        if winner is None:
+            winner = self._rollout(masks, to_move)
+
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            if winner == node.player:
+                node.wins += 1.0
+            elif winner == "Draw":
+                node.wins += 0.5
+            node = node.parent
+        return True
+
+    def _select(self, node):
+        log_visits = math.log(node.visits)
+        c = self.exploration
+        best, best_value = None, -math.inf
+        for child in node.children:
+            if child.winner is not None and child.winner == child.player:
+                return child  # a winning move: nothing else is worth exploring
+            value = child.wins / child.visits + c * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def _completes_line(self, mask, index):
+        for window in self.layout.cell_window_masks[index]:
+            if mask & window == window:
+                return True
+        return False
+
+    def _rollout(self, masks, player):
+        """Plays uniformly random moves to the end; returns the winner or "Draw"."""
+        empty = list(iter_bits(self.layout.full_mask & ~(masks[config.AI_PLAYER] | masks[config.HUMAN_PLAYER])))
+        self.rng.shuffle(empty)
+        mine, theirs = masks[player], masks[_other(player)]
+        window_masks = self.layout.cell_window_masks
+        for index in empty:
+            mine |= 1 << index
+            for window in window_masks[index]:
+                if mine & window == window:
+                    return player
+            mine, theirs = theirs, mine
+            player = _other(player)
+        return "Draw"
+
+
+# ---------------------------------------------------------------------- #
+#                          ROOT PARALLELISATION                          #
+# ---------------------------------------------------------------------- #
+def _search_worker(radius, winning_length, masks, player, time_budget, max_iterations,
+                   candidate_radius, seed):
+    """Worker process: one independent tree; returns its root statistics and iterations."""
+    tree = MCTS(get_layout(radius, winning_length), candidate_radius, seed=seed)
+    tree.search(masks, player, time_budget, max_iterations)
+    return tree.root_statistics(), tree.iterations
+
+
+def find_move(board, player, settings, tree, stop_event=None, progress=None, stats=None):
+    """
+    Chooses a move for 'player' on a Bitboard with the MCTS settings of a
+    difficulty level ("time_budget", "iterations", "candidate_radius",
+    "workers"). 'tree' is the game's MCTS, reused between moves. Worker
+    processes grow their own trees for the same time and their root
+    visit counts are added to this tree's before picking the move.
+    Returns a cell index, or None if there is no legal move.
+    """
+    layout = board.layout
+    candidate_radius = settings.get("candidate_radius")
+    time_budget = settings.get("time_budget")
+    max_iterations = settings.get("iterations")
+
+    workers = parallel_search.resolve_workers(settings.get("workers", 1))
+    futures = []
+    if workers > 1:
+        try:
+            pool = parallel_search.get_pool(workers)
+            futures = [
+                pool.submit(_search_worker, layout.radius, layout.winning_length, dict(board.masks),
+                            player, time_budget, max_iterations, candidate_radius, random.getrandbits(32))
+                for _ in range(workers - 1)
+            ]
+        except (OSError, NotImplementedError, BrokenProcessPool):
+            parallel_search.shutdown_pool()
+            futures = []
+
+    tree.search(board.masks, player, time_budget, max_iterations, stop_event, progress)
+    totals = {move: list(counts) for move, counts in tree.root_statistics().items()}
+    iterations = tree.iterations
+    for future in futures:
+        try:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    future.cancel()
+                    break
+                try:
+                    worker_stats, worker_iterations = future.result(timeout=0.05)
+                except FutureTimeout:
+                    continue
+                iterations += worker_iterations
+                for move, (visits, wins) in worker_stats.items():
+                    counts = totals.setdefault(move, [0, 0.0])
+                    counts[0] += visits
+                    counts[1] += wins
+                break
+        except BrokenProcessPool:
+            parallel_search.shutdown_pool()
+            break
+
+    if stats is not None:
+        stats.nodes += iterations
+        stats.depth = tree.summary()["depth"]
+    if not totals:
+        return None
+    return max(totals, key=lambda move: totals[move][0])
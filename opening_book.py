@@ -0,0 +1,235 @@
+# opening_book.py
+# Precomputed opening moves: an offline builder and a memory-mapped reader.
+#
+#   python opening_book.py build --plies 3 --depth 5 --workers 8
+#
+# The book is a sorted array of fixed-size records, so lookups binary-search
+# the memory-mapped file without loading it.
+#
+#   header : magic "HXBK", version, radius, winning_length, plies,
+#            key_bytes (u8 each), record count (u32)
+#   record : packed canonical position (key_bytes, big-endian),
+#            best move (u16, canonical cell index), score (i32)
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import config
+from bitboard import Bitboard, get_layout, popcount
+from symmetry import get_symmetry
+
+MAGIC = b"HXBK"
+VERSION = 1
+HEADER = struct.Struct(">4sBBBBBI")
+VALUE = struct.Struct(">Hi")
+SCORE_LIMIT = 2 ** 31 - 1
+
+
+def key_size(layout):
+    """Bytes needed for a packed (AI mask, human mask) pair."""
+    return (2 * layout.size + 7) // 8
+
+
+def pack_key(masks, layout):
+    value = (masks[config.AI_PLAYER] << layout.size) | masks[config.HUMAN_PLAYER]
+    return value.to_bytes(key_size(layout), "big")
+
+
+def side_to_move(masks):
+    """X always starts, so the side to move follows from the stone count."""
+    stones = popcount(masks[config.AI_PLAYER] | masks[config.HUMAN_PLAYER])
+    return config.HUMAN_PLAYER if stones % 2 == 0 else config.AI_PLAYER
+
+
+class OpeningBook:
+    """Read-only view of a book file; positions are looked up by binary search."""
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ValueError(f"{path} is not an opening book")
+        magic, version, radius, winning_length, plies, key_bytes, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.layout = get_layout(radius, winning_length)
+        self.plies = plies
+        self.key_bytes = key_bytes
+        self.count = count
+        self.record_size = key_bytes + VALUE.size
+        self.symmetry = get_symmetry(self.layout)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _find(self, key):
+        lo, hi = 0, self.count
+        size = self.record_size
+        base = HEADER.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = base + mid * size
+            probe = self._map[offset:offset + self.key_bytes]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return VALUE.unpack_from(self._map, offset + self.key_bytes)
+        return None
+
+    def lookup(self, board):
+        """
+        Returns (move, score) for a Bitboard, with 'move' a cell index in the
+        board's own orientation, or None if the position is not in the book.
+        """
+        if board.layout is not self.layout or popcount(board.occupied) > self.plies:
+            return None
+        canonical, t = self.symmetry.canonicalize(board.masks)
+        found = self._find(pack_key(canonical, self.layout))
+        if found is None:
+            return None
+        move, score = found
+        return self.symmetry.to_original(move, t), score
+
+
+_books = {}
+
+def get_book(path=None):
+    """The book at 'path' (default config.OPENING_BOOK_PATH), or None if there is none."""
+    if path is None:
+        path = config.OPENING_BOOK_PATH
+    if path not in _books:
+        try:
+            _books[path] = OpeningBook(path)
+        except (OSError, ValueError, struct.error):
+            _books[path] = None
+    return _books[path]
+
+
+# ---------------------------------------------------------------------- #
+#                                 BUILDER                                #
+# ---------------------------------------------------------------------- #
+def opening_positions(layout, plies):
+    """Every canonical position reachable in at most 'plies' moves, deduplicated by symmetry."""
+    symmetry = get_symmetry(layout)
+    empty = {config.HUMAN_PLAYER: 0, config.AI_PLAYER: 0}
+    frontier = {pack_key(empty, layout): empty}
+    positions = dict(frontier)
+    for _ in range(plies):
+        next_frontier = {}
+        for masks in frontier.values():
+            board = Bitboard(layout, dict(masks))
+            player = side_to_move(masks)
+            for index in board.empty_cells():
+                if board.is_winning_move(index, player):
+                    continue
+                child = dict(masks)
+                child[player] |= 1 << index
+                canonical, _ = symmetry.canonicalize(child)
+                next_frontier.setdefault(pack_key(canonical, layout), canonical)
+        frontier = next_frontier
+        positions.update(frontier)
+    return positions
+
+
+def _solve(radius, winning_length, masks, depth, candidate_radius):
+    """Worker: searches one canonical position, returns (move, score)."""
+    import ai
+    from transposition import TranspositionTable
+
+    layout = get_layout(radius, winning_length)
+    board = Bitboard(layout, dict(masks))
+    state = ai.SearchState(board, TranspositionTable(), candidate_radius)
+    maximizing = side_to_move(masks) == config.AI_PLAYER
+    score, move, _ = ai.iterative_deepening(state, depth, maximizing)
+    return move, max(-SCORE_LIMIT, min(SCORE_LIMIT, int(score)))
+
+
+def _read_checkpoint(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3:
+                    done[bytes.fromhex(parts[0])] = (int(parts[1]), int(parts[2]))
+    return done
+
+
+def write_book(path, layout, plies, entries):
+    """Writes {packed key: (move, score)} as a sorted book file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, layout.radius, layout.winning_length,
+                            plies, key_size(layout), len(entries)))
+        for key in sorted(entries):
+            move, score = entries[key]
+            f.write(key)
+            f.write(VALUE.pack(move, score))
+    os.replace(tmp_path, path)
+
+
+def build(out_path, plies, depth, workers=None, candidate_radius=None, radius=None, winning_length=None):
+    """
+    Searches every opening position up to 'plies' and writes the book.
+    Finished positions are appended to '<out_path>.partial' as they
+    complete, so an interrupted build resumes where it stopped.
+    """
+    layout = get_layout(radius, winning_length)
+    positions = opening_positions(layout, plies)
+    checkpoint = out_path + ".partial"
+    done = _read_checkpoint(checkpoint)
+    todo = [key for key in positions if key not in done]
+    print(f"{len(positions)} positions, {len(done)} already solved, {len(todo)} to go")
+
+    start = time.perf_counter()
+    with open(checkpoint, "a") as log, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_solve, layout.radius, layout.winning_length, positions[key], depth, candidate_radius): key
+            for key in todo
+        }
+        for n, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            move, score = future.result()
+            done[key] = (move, score)
+            log.write(f"{key.hex()} {move} {score}\n")
+            log.flush()
+            if n % 50 == 0 or n == len(todo):
+                print(f"  {n}/{len(todo)} ({time.perf_counter() - start:.1f}s)")
+
+    write_book(out_path, layout, plies, {key: done[key] for key in positions})
+    os.remove(checkpoint)
+    print(f"wrote {len(positions)} positions to {out_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HexaTac opening book tools.")
+    sub = parser.add_subparsers(dest="command")
+    b = sub.add_parser("build", help="search the opening tree and write a book")
+    b.add_argument("--out", default=config.OPENING_BOOK_PATH)
+    b.add_argument("--plies", type=int, default=3)
+    b.add_argument("--depth", type=int, default=5)
+    b.add_argument("--workers", type=int, default=None)
+    b.add_argument("--candidate-radius", type=int, default=None)
+    b.add_argument("--radius", type=int, default=None)
+    b.add_argument("--winning-length", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.command != "build":
+        parser.print_help()
+        return 1
+    build(args.out, args.plies, args.depth, args.workers, args.candidate_radius,
+          args.radius, args.winning_length)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+# parallel_search.py
+# Multi-core root-splitting search for the AI, plus a small speedup benchmark.
+#
+#   python parallel_search.py --depth 4 --max-workers 8
+
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import ai
+import config
+from bitboard import Bitboard, get_layout
+from transposition import TranspositionTable
+
+_pool = None
+_pool_workers = 0
+_manager = None  # serves the events that stop worker searches early
+
+
+def resolve_workers(workers):
+    """None means "one per core"; anything below 2 means single-core."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def get_pool(workers):
+    """Shared process pool, recreated only when the worker count changes."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def _stop_flag():
+    """An Event shared with the pool's processes, or None if one can't be made."""
+    global _manager
+    try:
+        if _manager is None:
+            _manager = multiprocessing.Manager()
+        return _manager.Event()
+    except (OSError, EOFError):
+        _manager = None
+        return None
+
+
+def shutdown_pool():
+    global _pool, _pool_workers, _manager
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
+    if _pool is not None:
+        try:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        except TypeError:  # Python < 3.9
+            _pool.shutdown(wait=False)
+        _pool = None
+        _pool_workers = 0
+
+
+# ---------------------------------------------------------------------- #
+#                              WORKER SIDE                               #
+# ---------------------------------------------------------------------- #
+# Each worker process keeps its transposition table between searches, like
+# the single-core search keeps the game's EngineState table. Entries are
+# facts about positions, so sharing one across games is harmless.
+_worker_tables = {}  # (radius, winning_length, size) -> TranspositionTable
+
+
+def _search_root_moves(radius, winning_length, masks, moves, maximizing_player,
+                       max_depth, time_budget, node_budget, candidate_radius, tt_size,
+                       collect_stats=False, stop_flag=None, seed=None):
+    """
+    Iteratively deepens over one slice of the root moves in a worker process.
+    Returns (results, proven, nodes, stats) where results[i] is
+    (depth, score, move) for every completed depth, 'proven' means the last
+    result is a forced win/loss that deeper searches cannot change, and
+    'stats' is a SearchStats dict when 'collect_stats' is set.
+
+    Setting 'stop_flag' (a shared Event) ends the search after depth 1 like
+    an exhausted budget. 'seed' holds entries of the caller's table (see
+    TranspositionTable.entries) loaded into this process's table first.
+    """
+    board = Bitboard(get_layout(radius, winning_length), dict(masks))
+    table_key = (radius, winning_length, tt_size)
+    tt = _worker_tables.get(table_key)
+    if tt is None:
+        tt = _worker_tables[table_key] = TranspositionTable(tt_size)
+    tt.new_search()
+    if seed:
+        tt.load(seed)
+    tt_hits, tt_misses = tt.hits, tt.misses
+    stats = ai.SearchStats() if collect_stats else None
+    state = ai.SearchState(board, tt, candidate_radius, stats=stats)
+    player = config.AI_PLAYER if maximizing_player else config.HUMAN_PLAYER
+    sign = 1 if maximizing_player else -1
+
+    start = time.perf_counter()
+    deadline = start + time_budget if time_budget else None
+    moves = list(moves)
+    results = []
+    proven = False
+    for depth in range(1, max_depth + 1):
+        if depth > 1:
+            if deadline is not None and time.perf_counter() - start > time_budget / 2:
+                break
+            if stop_flag is not None and stop_flag.is_set():
+                break
+            state.stop_event = stop_flag
+            state.set_limits(deadline, node_budget)
+        best_score, best_move = -math.inf, None
+        alpha, beta = -math.inf, math.inf
+        try:
+            for move in moves:
+                if board.is_winning_move(move, player):
+                    score = sign * ai.WIN_SCORE
+                else:
+                    state.make(move, player)
+                    score, _ = ai.minimax(state, depth - 1, not maximizing_player, alpha, beta, move, 1)
+                    state.unmake(move, player)
+                if sign * score > best_score:
+                    best_score, best_move = sign * score, move
+                if maximizing_player:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+        except ai.SearchTimeout:
+            break
+        results.append((depth, sign * best_score, best_move))
+        if stats is not None:
+            stats.depth = depth
+        # Search this iteration's best move first in the next one
+        moves.remove(best_move)
+        moves.insert(0, best_move)
+        if best_score >= ai.WIN_SCORE or best_score <= -ai.WIN_SCORE or depth >= len(state.empty):
+            proven = True
+            break
+    if stats is not None:
+        stats.nodes = state.nodes
+        stats.tt_hits = tt.hits - tt_hits
+        stats.tt_probes = (tt.hits - tt_hits) + (tt.misses - tt_misses)
+        stats = stats.to_dict()
+    return results, proven, state.nodes, stats
+
+
+# ---------------------------------------------------------------------- #
+#                              MASTER SIDE                               #
+# ---------------------------------------------------------------------- #
+def split_moves(moves, workers):
+    """Deals ordered root moves round-robin so every slice gets good moves."""
+    slices = [moves[i::workers] for i in range(workers)]
+    return [s for s in slices if s]
+
+
+def parallel_root_search(board, maximizing_player, max_depth, workers, time_budget=None,
+                         node_budget=None, candidate_radius=None, stop_event=None, stats=None,
+                         seed=None):
+    """
+    Splits the ordered root moves across 'workers' processes, each running
+    its own iterative deepening, and combines the results at the deepest
+    depth every slice completed. Without a time budget the result depends
+    only on the position, depth and worker count.
+
+    Setting 'stop_event' stops the workers after their current depth 1 and
+    combines what they completed. 'seed' (TranspositionTable.entries) is
+    loaded into every worker's table, e.g. what pondering found.
+    Returns (score, move, depth, nodes), or None if the pool is unavailable
+    so the caller can fall back to the single-core search. Worker counters
+    are added to 'stats' (a SearchStats) if given.
+    """
+    state = ai.SearchState(board, None, candidate_radius)
+    player = config.AI_PLAYER if maximizing_player else config.HUMAN_PLAYER
+    moves = state.candidate_moves()
+    ai._order_moves(state, moves, 0, player, None)
+    slices = split_moves(moves, workers)
+
+    layout = board.layout
+    tt_size = max(2, config.TRANSPOSITION_TABLE_SIZE // workers)
+    try:
+        pool = get_pool(workers)
+        stop_flag = _stop_flag() if stop_event is not None else None
+        futures = [
+            pool.submit(_search_root_moves, layout.radius, layout.winning_length, dict(board.masks),
+                        chunk, maximizing_player, max_depth, time_budget, node_budget,
+                        candidate_radius, tt_size, stats is not None, stop_flag, seed)
+            for chunk in slices
+        ]
+        outcomes = []
+        stopping = False
+        for future in futures:
+            while True:
+                if stop_event is not None and stop_event.is_set() and not stopping:
+                    if stop_flag is None:
+                        for f in futures:
+                            f.cancel()
+                        return None
+                    stop_flag.set()  # the workers return what they have completed
+                    stopping = True
+                try:
+                    outcomes.append(future.result(timeout=0.05))
+                    break
+                except FutureTimeout:
+                    continue
+    except (OSError, NotImplementedError, BrokenProcessPool):
+        shutdown_pool()
+        return None
+
+    sign = 1 if maximizing_player else -1
+    unproven = [results[-1][0] for results, proven, _, _ in outcomes if not proven and results]
+    depth = min(unproven) if unproven else max(results[-1][0] for results, _, _, _ in outcomes)
+    best = None
+    for results, proven, _, _ in outcomes:
+        usable = [r for r in results if r[0] <= depth]
+        if not usable:
+            continue
+        _, score, move = usable[-1]
+        if best is None or sign * score > sign * best[0]:
+            best = (score, move)
+    nodes = state.nodes + sum(n for _, _, n, _ in outcomes)
+    if stats is not None:
+        for _, _, _, worker_stats in outcomes:
+            stats.merge(worker_stats)
+        stats.depth = depth
+    if best is None:
+        return None
+    return best[0], best[1], depth, nodes
+
+
+# ---------------------------------------------------------------------- #
+#                               BENCHMARK                                #
+# ---------------------------------------------------------------------- #
+BENCH_OPENINGS = [
+    [(0, 0), (1, 0), (0, 1), (-1, 0)],
+    [(0, 0), (1, -1), (-1, 1), (0, 1), (1, 0)],
+    [(2, -1), (0, 0), (1, 0), (-1, 1), (0, -1), (1, 1)],
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure parallel search speedup against core count.")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--candidate-radius", type=int, default=2)
+    args = parser.parse_args()
+
+    from game_logic import HexaTacGame
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        elapsed = 0.0
+        chosen = []
+        for opening in BENCH_OPENINGS:
+            game = HexaTacGame()
+            for move in opening:
+                game.make_move(*move)
+            maximizing = game.current_player == config.AI_PLAYER
+            start = time.perf_counter()
+            if workers == 1:
+                state = ai.SearchState(game.bitboard, TranspositionTable(), args.candidate_radius)
+                _, move, _ = ai.iterative_deepening(state, args.depth, maximizing)
+            else:
+                get_pool(workers)  # don't time process start-up
+                start = time.perf_counter()
+                result = parallel_root_search(game.bitboard, maximizing, args.depth, workers,
+                                              candidate_radius=args.candidate_radius)
+                if result is None:
+                    # Timing the single-core fallback would report a bogus speedup
+                    print(f"workers={workers:2d}  no process pool available; stopping")
+                    shutdown_pool()
+                    return 1
+                move = result[1]
+            elapsed += time.perf_counter() - start
+            chosen.append(game.layout.cells[move])
+        if baseline is None:
+            baseline = elapsed
+        print(f"workers={workers:2d}  time={elapsed:7.3f}s  speedup={baseline / elapsed:5.2f}x  moves={chosen}")
+    shutdown_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+# records.py
+# Packed positions and an append-only binary file of game records.
+#
+#   python records.py stats games.hxr
+#   python records.py check            (self-test of the file format)
+#
+# A position packs into (2 * cells + 1) bits: the AI mask above the human
+# mask (as in the opening book) plus one side-to-move bit on top, 10 bytes
+# on the classic 37-cell board.
+#
+# Record files are written one game at a time and never rewritten:
+#
+#   header : magic "HXGR", version, radius, winning_length (u8 each)
+#   game   : result (u8), flags (u8), move count (u16), then per move
+#            the cell index (u16), the engine eval (i32) if flags & EVALS,
+#            and the seconds spent (f32) if flags & TIMES
+#
+# A reader memory-maps the file and walks it game by game, so even files
+# with millions of positions are streamed rather than loaded.
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import config
+from bitboard import get_layout, iter_bits
+from game_logic import HexaTacGame
+
+MAGIC = b"HXGR"
+VERSION = 1
+HEADER = struct.Struct(">4sBBB")
+GAME = struct.Struct(">BBH")
+MOVE = struct.Struct(">H")
+EVAL = struct.Struct(">i")
+TIME = struct.Struct(">f")
+
+# Flags of a game record
+EVALS = 1
+TIMES = 2
+
+# Result codes
+RESULTS = {None: 0, config.HUMAN_PLAYER: 1, config.AI_PLAYER: 2, "Draw": 3}
+RESULT_NAMES = {code: name for name, code in RESULTS.items()}
+
+# Stored in place of the eval of a move no engine searched
+NO_EVAL = -2 ** 31
+EVAL_LIMIT = 2 ** 31 - 1
+
+
+# ---------------------------------------------------------------------- #
+#                            POSITION PACKING                            #
+# ---------------------------------------------------------------------- #
+def packed_size(layout):
+    """Bytes per packed position on a layout."""
+    return (2 * layout.size + 1 + 7) // 8
+
+
+def pack_position(masks, player, layout):
+    """Packs a masks dict and the side to move into packed_size(layout) bytes."""
+    value = (masks[config.AI_PLAYER] << layout.size) | masks[config.HUMAN_PLAYER]
+    if player == config.AI_PLAYER:
+        value |= 1 << (2 * layout.size)
+    return value.to_bytes(packed_size(layout), "big")
+
+
+def unpack_position(data, layout):
+    """Inverse of pack_position: returns (masks, player)."""
+    value = int.from_bytes(data, "big")
+    cells = layout.full_mask
+    masks = {
+        config.HUMAN_PLAYER: value & cells,
+        config.AI_PLAYER: (value >> layout.size) & cells,
+    }
+    player = config.AI_PLAYER if value >> (2 * layout.size) & 1 else config.HUMAN_PLAYER
+    return masks, player
+
+
+def pack_game(game):
+    """Packed current position of a HexaTacGame."""
+    return pack_position(game.bitboard.masks, game.current_player, game.layout)
+
+
+def unpack_game(data, radius=None, winning_length=None):
+    """
+    A HexaTacGame at a packed position. The stones are replayed
+    alternately, X first, so the counts must be ones a real game can
+    reach; raises ValueError otherwise. In a won position the stone that
+    all the winner's full lines share is played last, so the line is
+    completed by the final move as in a real game.
+    """
+    game = HexaTacGame(radius, winning_length)
+    masks, player = unpack_position(data, game.layout)
+    stones = {owner: list(iter_bits(mask)) for owner, mask in masks.items()}
+    xs, os_ = stones[config.HUMAN_PLAYER], stones[config.AI_PLAYER]
+    if len(xs) - len(os_) not in (0, 1):
+        raise ValueError("impossible stone counts")
+    winners = []
+    for owner, mask in masks.items():
+        lines = [window for window in game.layout.windows if mask & window == window]
+        if lines:
+            common = mask
+            for window in lines:
+                common &= window
+            if not common:
+                raise ValueError("separate winning lines")
+            last = (common & -common).bit_length() - 1
+            stones[owner].remove(last)
+            stones[owner].append(last)
+            winners.append(owner)
+    if len(winners) > 1:
+        raise ValueError("both players have a line")
+    if winners and (winners[0] == config.HUMAN_PLAYER) != (len(xs) > len(os_)):
+        raise ValueError("the winner did not move last")
+    order = []
+    for i, x in enumerate(xs):
+        order.append(x)
+        if i < len(os_):
+            order.append(os_[i])
+    for index in order:
+        if game.is_game_over or not game.make_move(*game.layout.cells[index]):
+            raise ValueError("stones after the game was decided")
+    if not game.is_game_over:
+        game.current_player = player
+    return game
+
+
+# ---------------------------------------------------------------------- #
+#                                 WRITER                                 #
+# ---------------------------------------------------------------------- #
+def _game_size(flags, count):
+    """Bytes of a game record, header included."""
+    move = MOVE.size + (EVAL.size if flags & EVALS else 0) + (TIME.size if flags & TIMES else 0)
+    return GAME.size + count * move
+
+
+def _complete_end(f):
+    """Offset just past the last complete game of an open record file."""
+    end = os.fstat(f.fileno()).st_size
+    offset = HEADER.size
+    while offset + GAME.size <= end:
+        f.seek(offset)
+        _, flags, count = GAME.unpack(f.read(GAME.size))
+        size = _game_size(flags, count)
+        if offset + size > end:
+            break
+        offset += size
+    return offset
+
+
+class RecordWriter:
+    """
+    Appends games to a record file, creating it (with its header) if it
+    does not exist. Every game is written and flushed as a whole, so an
+    interrupted writer leaves at most one truncated game at the end;
+    readers skip it and the next writer cuts it off before appending.
+    """
+    def __init__(self, path, radius=None, winning_length=None):
+        self.layout = get_layout(radius, winning_length)
+        existing = os.path.exists(path) and os.path.getsize(path) > 0
+        if existing:
+            with open(path, "r+b") as f:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    raise ValueError(f"{path} is not a game record file")
+                magic, version, radius, winning_length = HEADER.unpack(header)
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError(f"{path} is not a game record file")
+                if (radius, winning_length) != (self.layout.radius, self.layout.winning_length):
+                    raise ValueError(f"{path} holds games for radius {radius}, {winning_length} in a row")
+                # Drop a game an interrupted writer left truncated, or the
+                # games appended now would be read as the rest of it
+                end = _complete_end(f)
+                if end < os.fstat(f.fileno()).st_size:
+                    f.truncate(end)
+        self._file = open(path, "ab")
+        if not existing:
+            self._file.write(HEADER.pack(MAGIC, VERSION, self.layout.radius, self.layout.winning_length))
+            self._file.flush()
+
+    def write(self, moves, result, evals=None, times=None):
+        """
+        Appends one game. 'moves' are cell indices or (q, r) cells; 'evals'
+        (ints, None for moves no engine searched) and 'times' (seconds)
+        are optional and, if given, have one entry per move.
+        """
+        index = self.layout.index
+        flags = (EVALS if evals is not None else 0) | (TIMES if times is not None else 0)
+        parts = [GAME.pack(RESULTS[result], flags, len(moves))]
+        for i, move in enumerate(moves):
+            parts.append(MOVE.pack(move if isinstance(move, int) else index[tuple(move)]))
+            if evals is not None:
+                value = NO_EVAL if evals[i] is None else max(-EVAL_LIMIT, min(EVAL_LIMIT, int(evals[i])))
+                parts.append(EVAL.pack(value))
+            if times is not None:
+                parts.append(TIME.pack(times[i]))
+        self._file.write(b"".join(parts))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------------------- #
+#                                 READER                                 #
+# ---------------------------------------------------------------------- #
+class GameRecord:
+    """One game read back: move indices, result, and optional evals/times lists."""
+    __slots__ = ("moves", "result", "evals", "times")
+
+    def __init__(self, moves, result, evals, times):
+        self.moves = moves
+        self.result = result
+        self.evals = evals
+        self.times = times
+
+
+class RecordReader:
+    """Memory-mapped, read-only view of a record file; iterate it for GameRecords."""
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ValueError(f"{path} is not a game record file")
+        magic, version, radius, winning_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a game record file")
+        self.layout = get_layout(radius, winning_length)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        data = self._map
+        end = len(data)
+        offset = HEADER.size
+        while offset + GAME.size <= end:
+            result, flags, count = GAME.unpack_from(data, offset)
+            start = offset + GAME.size
+            if offset + _game_size(flags, count) > end:
+                return  # truncated last game
+            moves = []
+            evals = [] if flags & EVALS else None
+            times = [] if flags & TIMES else None
+            position = start
+            for _ in range(count):
+                moves.append(MOVE.unpack_from(data, position)[0])
+                position += MOVE.size
+                if evals is not None:
+                    value = EVAL.unpack_from(data, position)[0]
+                    evals.append(None if value == NO_EVAL else value)
+                    position += EVAL.size
+                if times is not None:
+                    times.append(TIME.unpack_from(data, position)[0])
+                    position += TIME.size
+            yield GameRecord(moves, RESULT_NAMES.get(result), evals, times)
+            offset = position
+
+    def positions(self):
+        """
+        Yields (masks, player, move, record, ply) for every position of
+        every game: the position before 'move' was played by 'player'.
+        'masks' is reused between positions; copy it to keep it.
+        """
+        for record in self:
+            masks = {config.HUMAN_PLAYER: 0, config.AI_PLAYER: 0}
+            player = config.HUMAN_PLAYER
+            for ply, move in enumerate(record.moves):
+                yield masks, player, move, record, ply
+                masks[player] |= 1 << move
+                player = config.AI_PLAYER if player == config.HUMAN_PLAYER else config.HUMAN_PLAYER
+
+
+def check():
+    """
+    Writes games, cuts the file in the middle of the last one (as an
+    interrupted writer would), appends more and reads everything back.
+    Returns a list of failures, empty if all is well.
+    """
+    games = [([0, 7, 3], "X", [12, None, -4], [0.5, 1.0, 0.25]),
+             ([5, 9], None, None, None),
+             ([1, 2, 4, 8], "Draw", None, [0.125, 2.0, 0.75, 3.5]),
+             ([6], "O", [100], None)]
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "check.hxr")
+        with RecordWriter(path) as writer:
+            for game in games[:2]:
+                writer.write(*game)
+        complete = os.path.getsize(path)
+        with RecordWriter(path) as writer:
+            writer.write(*games[2])
+        for cut in range(complete + 1, os.path.getsize(path)):
+            with open(path, "r+b") as f:
+                f.truncate(cut)
+            with RecordWriter(path) as writer:
+                writer.write(*games[2])
+                writer.write(*games[3])
+            with RecordReader(path) as reader:
+                read = [(r.moves, r.result, r.evals, r.times) for r in reader]
+            if read != games:
+                failures.append(f"cut at byte {cut}: read {len(read)} games, expected {len(games)}")
+            with open(path, "r+b") as f:
+                f.truncate(complete)
+            with RecordWriter(path) as writer:
+                writer.write(*games[2])
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HexaTac game record tools.")
+    sub = parser.add_subparsers(dest="command")
+    s = sub.add_parser("stats", help="summarise a record file")
+    s.add_argument("path")
+    sub.add_parser("check", help="self-test: append after a truncated game and read back")
+    args = parser.parse_args(argv)
+    if args.command == "check":
+        failures = check()
+        for failure in failures:
+            print(failure)
+        print("ok" if not failures else f"{len(failures)} failures")
+        return 1 if failures else 0
+    if args.command != "stats":
+        parser.print_help()
+        return 1
+    games = positions = 0
+    results = {}
+    with RecordReader(args.path) as reader:
+        for record in reader:
+            games += 1
+            positions += len(record.moves)
+            results[record.result] = results.get(record.result, 0) + 1
+        layout = reader.layout
+    print(f"radius {layout.radius}, {layout.winning_length} in a row: {games} games, {positions} positions")
+    for result, count in sorted(results.items(), key=lambda item: str(item[0])):
+        print(f"  {result}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,549 @@
+# server.py
+# Asyncio TCP server hosting many HexaTac games, with searches on a process pool.
+#
+#   python server.py serve --port 8765 --workers 4
+#   python server.py load --port 8765 --games 300 --difficulty Easy
+#
+# The protocol is JSON lines. Each request is an object with an "op" (and
+# an optional "id" echoed back); each response has "ok" plus either the
+# result fields or an "error". One connection is one session, which owns
+# one HexaTacGame at a time:
+#
+#   {"op": "new_game", "difficulty": "Medium", "radius": 3, "winning_length": 4,
+#    "settings": {...overrides}}         overrides are checked against SETTING_LIMITS
+#                                         and laid over the level (then config.DEFAULT_SETTINGS)
+#   {"op": "move", "cell": [q, r]}        the human (X) move
+#   {"op": "ai_move", "deadline_ms": 2000} the engine moves for the side to move
+#   {"op": "state"}
+#   {"op": "stats"}                       server-wide latency histograms
+#
+# Searches go to one single-process executor per worker, chosen by session,
+# so a session's EngineState (transposition table, MCTS tree) stays cached
+# in the same process between its moves. Connections beyond
+# config.SERVER_MAX_SESSIONS are turned away, at most
+# config.SERVER_MAX_PENDING searches are queued or running at once (others
+# wait for a slot until their deadline), and a session reads its next
+# request only once the previous response has been sent. A search that
+# fails is an error response to its request; a shard whose process died
+# is replaced.
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import ai
+import config
+import records
+from game_logic import HexaTacGame
+
+# Upper bucket edges (milliseconds) of the latency histograms
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf")]
+
+
+class RequestError(Exception):
+    """A request that cannot be served; reported to the client as an error."""
+    pass
+
+
+# Difficulty settings a client may override: name -> (type, lowest, highest,
+# None allowed). Numbers are clamped into range; "workers" and "ponder"
+# are always set by the server.
+SETTING_LIMITS = {
+    "depth": (int, 1, 8, False),
+    "mistake": (float, 0.0, 1.0, False),
+    "time_budget": (float, 0.01, None, True),
+    "node_budget": (int, 1, None, True),
+    "iterations": (int, 1, None, True),
+    "candidate_radius": (int, 0, 3, True),
+    "threat_nodes": (int, 0, 100000, False),
+    "endgame_empty": (int, 0, 16, False),
+    "book": (bool, None, None, False),
+    "engine": (str, None, None, False),
+}
+ENGINES = ("minimax", "mcts")
+
+
+def _is_number(value, kind=float):
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) if kind is int else isinstance(value, (int, float))
+
+
+def check_settings(overrides):
+    """Validated copy of a client's settings overrides; raises RequestError."""
+    if not isinstance(overrides, dict):
+        raise RequestError("settings must be an object")
+    settings = {}
+    for name, value in overrides.items():
+        if name not in SETTING_LIMITS:
+            raise RequestError(f"unknown setting {name!r}")
+        kind, low, high, nullable = SETTING_LIMITS[name]
+        if value is None and nullable:
+            settings[name] = None
+        elif kind is bool:
+            if not isinstance(value, bool):
+                raise RequestError(f"{name} must be true or false")
+            settings[name] = value
+        elif kind is str:
+            if value not in ENGINES:
+                raise RequestError(f"{name} must be one of {', '.join(ENGINES)}")
+            settings[name] = value
+        else:
+            if not _is_number(value, kind) or value != value:  # rejects NaN too
+                raise RequestError(f"{name} must be {'an integer' if kind is int else 'a number'}")
+            value = max(low, value)
+            settings[name] = min(high, value) if high is not None else value
+    return settings
+
+
+# ---------------------------------------------------------------------- #
+#                              WORKER SIDE                               #
+# ---------------------------------------------------------------------- #
+_engine_states = OrderedDict()  # session id -> EngineState, least recently used first
+
+
+def _search(session_id, game_number, radius, winning_length, packed, settings):
+    """
+    Worker: finds a move for the packed position. EngineStates are kept
+    per (session, game) so later moves of the game reuse the caches.
+    Returns ((q, r) or None, seconds spent).
+    """
+    start = time.perf_counter()
+    key = (session_id, game_number)
+    engine_state = _engine_states.pop(key, None)
+    if engine_state is None:
+        engine_state = ai.EngineState(config.SERVER_TT_SIZE)
+    _engine_states[key] = engine_state
+    while len(_engine_states) > config.SERVER_CACHED_SESSIONS:
+        _engine_states.popitem(last=False)
+    game = records.unpack_game(packed, radius, winning_length)
+    move = ai.find_best_move(game, settings, engine_state)
+    return move, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------- #
+#                                METRICS                                 #
+# ---------------------------------------------------------------------- #
+class LatencyHistogram:
+    """Counts of latencies per LATENCY_BUCKETS bucket, with percentile estimates."""
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        for i, edge in enumerate(LATENCY_BUCKETS):
+            if ms <= edge:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        """Upper edge of the bucket holding the given fraction of samples."""
+        if not self.total:
+            return 0.0
+        seen = 0
+        for edge, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= fraction * self.total:
+                return min(edge, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            "count": self.total,
+            "mean_ms": self.sum_ms / self.total if self.total else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": {str(edge): count for edge, count in zip(LATENCY_BUCKETS, self.counts) if count},
+        }
+
+
+# ---------------------------------------------------------------------- #
+#                                 SERVER                                 #
+# ---------------------------------------------------------------------- #
+class Session:
+    """One connection's game."""
+    def __init__(self, session_id):
+        self.id = session_id
+        self.game = None
+        self.game_number = 0
+        self.settings = None
+
+
+class GameServer:
+    """Serves sessions over asyncio streams and runs their searches on worker processes."""
+    def __init__(self, workers=None, max_sessions=None, max_pending=None, deadline=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_sessions = max_sessions or config.SERVER_MAX_SESSIONS
+        self.max_pending = max_pending or config.SERVER_MAX_PENDING or 4 * self.workers
+        self.deadline = deadline or config.SERVER_DEADLINE
+        self.shards = [ProcessPoolExecutor(max_workers=1) for _ in range(self.workers)]
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+        self.slots = None  # asyncio.Semaphore, made on the server's loop
+        self.rejected = {"sessions": 0, "busy": 0, "deadline": 0}
+        self.latency = {}
+        self.started = time.time()
+
+    def record(self, name, seconds):
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency[name] = LatencyHistogram()
+        histogram.add(seconds)
+
+    async def start(self, host, port):
+        self.slots = asyncio.Semaphore(self.max_pending)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        for shard in self.shards:
+            shard.shutdown(wait=False)
+
+    def submit(self, index, *args):
+        """Runs _search(*args) on a shard, replacing the shard first if its process has died."""
+        loop = asyncio.get_running_loop()
+        shard = self.shards[index]
+        try:
+            return loop.run_in_executor(shard, _search, *args)
+        except BrokenProcessPool:
+            self.replace_shard(index, shard)
+            return loop.run_in_executor(self.shards[index], _search, *args)
+
+    def replace_shard(self, index, broken):
+        """Starts a new executor for a shard whose process died (once, however many searches saw it)."""
+        if self.shards[index] is broken:
+            broken.shutdown(wait=False)
+            self.shards[index] = ProcessPoolExecutor(max_workers=1)
+
+    # ------------------------------------------------------------------ #
+    #                            CONNECTIONS                             #
+    # ------------------------------------------------------------------ #
+    async def handle_connection(self, reader, writer):
+        if len(self.sessions) >= self.max_sessions:
+            self.rejected["sessions"] += 1
+            await self._send(writer, {"ok": False, "error": "server full"})
+            writer.close()
+            return
+        session = Session(next(self.session_ids))
+        self.sessions[session.id] = session
+        try:
+            await self._send(writer, {"ok": True, "session": session.id})
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start = time.perf_counter()
+                response, op = await self._respond(session, line)
+                await self._send(writer, response)
+                self.record(op, time.perf_counter() - start)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self.sessions[session.id]
+            writer.close()
+
+    @staticmethod
+    async def _send(writer, message):
+        writer.write((json.dumps(message) + "\n").encode())
+        await writer.drain()  # don't outrun a slow client
+
+    async def _respond(self, session, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError
+        except ValueError:
+            return {"ok": False, "error": "requests must be JSON objects"}, "invalid"
+        op = request.get("op")
+        handler = {
+            "new_game": self.op_new_game,
+            "move": self.op_move,
+            "ai_move": self.op_ai_move,
+            "state": self.op_state,
+            "stats": self.op_stats,
+        }.get(op)
+        try:
+            if handler is None:
+                raise RequestError(f"unknown op {op!r}")
+            response = await handler(session, request)
+            response["ok"] = True
+        except RequestError as e:
+            response = {"ok": False, "error": str(e)}
+        except Exception as e:  # a bug, not the client's fault: log it, keep the session
+            traceback.print_exc()
+            response = {"ok": False, "error": f"internal error: {type(e).__name__}"}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response, op if handler is not None else "invalid"
+
+    # ------------------------------------------------------------------ #
+    #                             OPERATIONS                             #
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def state(session):
+        game = session.game
+        if game is None:
+            return {"game": None}
+        return {
+            "game": session.game_number,
+            "to_move": game.current_player,
+            "game_over": game.is_game_over,
+            "winner": game.winner,
+            "position": records.pack_game(game).hex(),
+        }
+
+    async def op_new_game(self, session, request):
+        difficulty = request.get("difficulty", "Medium")
+        if not isinstance(difficulty, str) or difficulty not in config.DIFFICULTY_LEVELS:
+            raise RequestError(f"unknown difficulty {difficulty!r}")
+        settings = dict(config.DEFAULT_SETTINGS, **config.DIFFICULTY_LEVELS[difficulty])
+        settings.update(check_settings(request.get("settings", {})))
+        # The pool is the parallelism; each search stays on its worker
+        settings["workers"] = 1
+        settings["ponder"] = False
+        radius = request.get("radius")
+        winning_length = request.get("winning_length")
+        if radius is not None and not (_is_number(radius, int) and 1 <= radius <= config.SERVER_MAX_RADIUS):
+            raise RequestError(f"radius must be an integer from 1 to {config.SERVER_MAX_RADIUS}")
+        longest = 2 * (radius if radius is not None else config.HEX_RADIUS) + 1
+        if winning_length is not None and not (_is_number(winning_length, int) and 3 <= winning_length <= longest):
+            raise RequestError(f"winning_length must be an integer from 3 to {longest}")
+        game = HexaTacGame(radius, winning_length)
+        session.game = game
+        session.game_number += 1
+        session.settings = settings
+        return self.state(session)
+
+    async def op_move(self, session, request):
+        game = session.game
+        if game is None:
+            raise RequestError("no game; send new_game first")
+        if game.is_game_over:
+            raise RequestError("the game is over")
+        if game.current_player != config.HUMAN_PLAYER:
+            raise RequestError("not your turn")
+        cell = request.get("cell")
+        if not (isinstance(cell, list) and len(cell) == 2 and all(_is_number(c, int) for c in cell)):
+            raise RequestError("move needs a cell [q, r]")
+        q, r = cell
+        if not game.make_move(q, r):
+            raise RequestError("illegal move")
+        return self.state(session)
+
+    async def op_ai_move(self, session, request):
+        game = session.game
+        if game is None:
+            raise RequestError("no game; send new_game first")
+        if game.is_game_over:
+            raise RequestError("the game is over")
+        deadline = request.get("deadline_ms")
+        if deadline is None:
+            deadline = self.deadline
+        elif _is_number(deadline) and deadline > 0:
+            deadline = min(deadline / 1000.0, config.SERVER_MAX_DEADLINE)
+        else:
+            raise RequestError("deadline_ms must be a positive number")
+        start = time.perf_counter()
+
+        # Admission: wait for a search slot, but not past the deadline
+        try:
+            await asyncio.wait_for(self.slots.acquire(), deadline)
+        except asyncio.TimeoutError:
+            self.rejected["busy"] += 1
+            raise RequestError("busy")
+        queued = time.perf_counter() - start
+        self.record("queue_wait", queued)
+        remaining = deadline - queued
+        # The search itself has to end in time, whatever the settings say;
+        # one abandoned by the deadline still holds its shard until it does
+        settings = dict(session.settings)
+        settings["time_budget"] = max(0.01, min(settings.get("time_budget") or math.inf, remaining * 0.8))
+        settings["node_budget"] = min(settings.get("node_budget") or math.inf, config.SERVER_NODE_BUDGET)
+        settings["iterations"] = min(settings.get("iterations") or math.inf, config.SERVER_NODE_BUDGET)
+        index = session.id % len(self.shards)
+        shard = self.shards[index]
+        try:
+            future = self.submit(index, session.id, session.game_number, game.radius,
+                                 game.winning_length, records.pack_game(game), settings)
+        except BaseException:
+            self.slots.release()
+            raise
+        # The slot is held until the search really finishes, even past the
+        # deadline, so max_pending bounds the work queued on the shards
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            move, seconds = await asyncio.wait_for(asyncio.shield(future), remaining)
+        except asyncio.TimeoutError:
+            self.rejected["deadline"] += 1
+            raise RequestError("deadline exceeded")
+        except BrokenProcessPool:
+            self.replace_shard(index, shard)
+            raise RequestError("search worker died; try again")
+        except Exception as e:
+            traceback.print_exc()
+            raise RequestError(f"search failed: {type(e).__name__}: {e}")
+        self.record("search", seconds)
+
+        if move is None or not game.make_move(*move):
+            raise RequestError("engine found no move")
+        response = self.state(session)
+        response["move"] = list(move)
+        return response
+
+    async def op_stats(self, session, request):
+        return {
+            "sessions": len(self.sessions),
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "rejected": dict(self.rejected),
+            "uptime": time.time() - self.started,
+            "latency": {name: histogram.to_dict() for name, histogram in sorted(self.latency.items())},
+        }
+
+    async def op_state(self, session, request):
+        return self.state(session)
+
+
+async def _serve(server, host, port):
+    listener = await server.start(host, port)
+    print(f"serving on {host}:{port} with {server.workers} search workers", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def serve(host, port, workers=None):
+    """Runs a GameServer until interrupted."""
+    server = GameServer(workers)
+    try:
+        asyncio.run(_serve(server, host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+# ---------------------------------------------------------------------- #
+#                                 CLIENT                                 #
+# ---------------------------------------------------------------------- #
+class Client:
+    """Minimal asyncio client for the server's JSON-lines protocol."""
+    def __init__(self, reader, writer, session):
+        self.reader = reader
+        self.writer = writer
+        self.session = session
+        self.ids = itertools.count(1)
+
+    @classmethod
+    async def connect(cls, host=None, port=None):
+        reader, writer = await asyncio.open_connection(host or config.SERVER_HOST, port or config.SERVER_PORT)
+        hello = json.loads(await reader.readline())
+        if not hello.get("ok"):
+            writer.close()
+            raise ConnectionError(hello.get("error", "refused"))
+        return cls(reader, writer, hello["session"])
+
+    async def request(self, op, **fields):
+        """Sends one request and returns its response dict."""
+        fields["op"] = op
+        fields["id"] = next(self.ids)
+        self.writer.write((json.dumps(fields) + "\n").encode())
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (AttributeError, ConnectionError):  # Python < 3.7
+            pass
+
+
+async def _play_random(host, port, difficulty, seed, stats):
+    """Load-test session: random human moves against the server's AI."""
+    rng = random.Random(seed)
+    client = await Client.connect(host, port)
+    try:
+        state = await client.request("new_game", difficulty=difficulty)
+        board = HexaTacGame()
+        while not state["game_over"]:
+            empty = board.get_valid_moves()
+            cell = rng.choice(empty)
+            state = await client.request("move", cell=list(cell))
+            board.make_move(*cell)
+            if state["game_over"]:
+                break
+            start = time.perf_counter()
+            state = await client.request("ai_move")
+            stats.add(time.perf_counter() - start)
+            if not state["ok"]:
+                return state["error"]
+            board.make_move(*state["move"])
+        return state["winner"]
+    finally:
+        await client.close()
+
+
+async def load_test(host, port, games, difficulty):
+    """Plays 'games' concurrent games and reports client-side ai_move latency."""
+    latency = LatencyHistogram()
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(_play_random(host, port, difficulty, seed, latency) for seed in range(games)),
+        return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    results = {}
+    for outcome in outcomes:
+        name = repr(outcome) if isinstance(outcome, Exception) else str(outcome)
+        results[name] = results.get(name, 0) + 1
+    print(f"{games} games in {elapsed:.1f}s: {results}")
+    print("ai_move latency:", json.dumps(latency.to_dict()))
+    client = await Client.connect(host, port)
+    print("server:", json.dumps((await client.request("stats"))["latency"]))
+    await client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HexaTac game server.")
+    sub = parser.add_subparsers(dest="command")
+    s = sub.add_parser("serve", help="run the server")
+    s.add_argument("--host", default=config.SERVER_HOST)
+    s.add_argument("--port", type=int, default=config.SERVER_PORT)
+    s.add_argument("--workers", type=int, default=None, help="search processes (default: one per core)")
+    l = sub.add_parser("load", help="play concurrent random games against a running server")
+    l.add_argument("--host", default=config.SERVER_HOST)
+    l.add_argument("--port", type=int, default=config.SERVER_PORT)
+    l.add_argument("--games", type=int, default=100)
+    l.add_argument("--difficulty", default="Easy")
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        serve(args.host, args.port, args.workers)
+    elif args.command == "load":
+        asyncio.run(load_test(args.host, args.port, args.games, args.difficulty))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
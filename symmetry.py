@@ -0,0 +1,102 @@
+# symmetry.py
+# The 12 symmetries of the hexagonal board, used to canonicalise cached positions.
+
+import config
+from bitboard import iter_bits
+from transposition import get_zobrist
+
+
+def _rotate(q, r):
+    """60° rotation in axial coordinates: (q, r, s) -> (-r, -s, -q)."""
+    return -r, q + r
+
+
+def _reflect(q, r):
+    """Mirror that swaps the r and s axes: (q, r, s) -> (q, s, r)."""
+    return q, -q - r
+
+
+def _transform(q, r, rotations, reflected):
+    if reflected:
+        q, r = _reflect(q, r)
+    for _ in range(rotations):
+        q, r = _rotate(q, r)
+    return q, r
+
+
+# (rotations, reflected) for each symmetry; index 0 is the identity
+TRANSFORMS = [(rot, ref) for ref in (False, True) for rot in range(6)]
+IDENTITY = 0
+
+
+class SymmetryTables:
+    """
+    Per-symmetry cell permutations for a BoardLayout.
+
+    perms[t][i] is where cell i goes under symmetry t, and inverse[t]
+    undoes it. A position's canonical form is the transform of it with
+    the smallest key; moves found in canonical orientation are mapped back
+    with to_original().
+    """
+    def __init__(self, layout):
+        self.layout = layout
+        index = layout.index
+        self.perms = []
+        for rotations, reflected in TRANSFORMS:
+            self.perms.append([index[_transform(q, r, rotations, reflected)] for (q, r) in layout.cells])
+        self.inverse = []
+        for perm in self.perms:
+            inverse = [0] * layout.size
+            for i, j in enumerate(perm):
+                inverse[j] = i
+            self.inverse.append(inverse)
+
+        # Zobrist keys such that hashing with zobrist_keys[t] gives the
+        # ordinary hash of the position transformed by t
+        base = get_zobrist(layout).keys
+        self.zobrist_keys = [
+            {player: [keys[perm[i]] for i in range(layout.size)] for player, keys in base.items()}
+            for perm in self.perms
+        ]
+
+    def transform_mask(self, mask, t):
+        perm = self.perms[t]
+        out = 0
+        for i in iter_bits(mask):
+            out |= 1 << perm[i]
+        return out
+
+    def transform_masks(self, masks, t):
+        return {player: self.transform_mask(mask, t) for player, mask in masks.items()}
+
+    def canonicalize(self, masks):
+        """
+        Returns (canonical_masks, t): the symmetric image of 'masks' with
+        the smallest (AI mask, human mask) pair, and the transform producing it.
+        """
+        best = None
+        best_t = IDENTITY
+        for t in range(len(TRANSFORMS)):
+            image = self.transform_masks(masks, t)
+            key = (image[config.AI_PLAYER], image[config.HUMAN_PLAYER])
+            if best is None or key < best[0]:
+                best = (key, image)
+                best_t = t
+        return best[1], best_t
+
+    def to_canonical(self, move, t):
+        return self.perms[t][move]
+
+    def to_original(self, move, t):
+        return self.inverse[t][move]
+
+
+_tables = {}
+
+def get_symmetry(layout):
+    """Returns the shared SymmetryTables for a layout."""
+    key = (layout.radius, layout.winning_length)
+    tables = _tables.get(key)
+    if tables is None:
+        tables = _tables[key] = SymmetryTables(layout)
+    return tables
@@ -0,0 +1,143 @@
+# threats.py
+# Forcing-move solver: finds wins built from an unbroken chain of threats.
+#
+# A threat is a move after which its player needs one more stone to
+# complete a line. The opponent has to block that cell (or win on the
+# spot), so only the attacker's moves branch and the defender's replies
+# are forced. Two threats at once cannot both be blocked. Searching only
+# these sequences ("victory by continuous fours") reaches forced wins far
+# deeper than a full-width minimax of the same cost.
+
+import time
+
+import config
+from bitboard import popcount, iter_bits
+
+
+class BudgetExhausted(Exception):
+    """Raised inside the solver when its node budget or deadline runs out, or it is stopped."""
+    pass
+
+
+class ThreatSolver:
+    """
+    Proves forced wins by threat sequences on a BoardLayout.
+
+    'max_depth' is the most attacking moves in one sequence and
+    'node_budget' the most positions examined per solve() call. Positions
+    proven not to win are remembered (with the depth they were searched
+    to) for the rest of the call.
+    """
+    def __init__(self, layout, max_depth=8, node_budget=10000):
+        self.layout = layout
+        self.max_depth = max_depth
+        self.node_budget = node_budget
+        self.length = layout.winning_length
+        self.windows = layout.windows
+        self.cell_window_masks = layout.cell_window_masks
+        self.nodes = 0
+        self.deadline = None
+        self.stop_event = None
+        self._failed = {}
+
+    def solve(self, board, player, deadline=None, stop_event=None):
+        """
+        Returns the cell index that starts a forced win for 'player' (to
+        move) on the Bitboard, or None if none was found within the node
+        budget (or before the perf_counter() 'deadline', if given, or
+        before 'stop_event' was set).
+        """
+        opponent = config.HUMAN_PLAYER if player == config.AI_PLAYER else config.AI_PLAYER
+        self.nodes = 0
+        self.deadline = deadline
+        self.stop_event = stop_event
+        self._failed = {}
+        try:
+            return self._attack(board.masks[player], board.masks[opponent], self.max_depth)
+        except BudgetExhausted:
+            return None
+
+    # ------------------------------------------------------------------ #
+    #                             THREATS                                #
+    # ------------------------------------------------------------------ #
+    def _scan(self, own, opp):
+        """
+        One pass over the windows: (cells where 'own' wins now, cells where
+        'own' makes a threat, cells where 'opp' wins now).
+        """
+        wins = makes = opp_wins = 0
+        near = self.length - 1
+        for window in self.windows:
+            mine = own & window
+            theirs = opp & window
+            if mine and not theirs:
+                count = popcount(mine)
+                if count == near:
+                    wins |= window & ~mine
+                elif count == near - 1:
+                    makes |= window & ~mine
+            elif theirs and not mine:
+                if popcount(theirs) == near:
+                    opp_wins |= window & ~theirs
+        return wins, makes, opp_wins
+
+    def _threats_through(self, own, opp, index):
+        """Cells where 'own' would win, among the lines through 'index'."""
+        near = self.length - 1
+        cells = 0
+        for window in self.cell_window_masks[index]:
+            mine = own & window
+            if not opp & window and popcount(mine) == near:
+                cells |= window & ~mine
+        return cells
+
+    # ------------------------------------------------------------------ #
+    #                              SEARCH                                #
+    # ------------------------------------------------------------------ #
+    def _attack(self, own, opp, depth):
+        """Attacker to move: a move that wins by force, or None."""
+        self.nodes += 1
+        if self.nodes > self.node_budget:
+            raise BudgetExhausted()
+        if self.nodes % 256 == 0:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise BudgetExhausted()
+            if self.stop_event is not None and self.stop_event.is_set():
+                raise BudgetExhausted()
+
+        wins, makes, opp_wins = self._scan(own, opp)
+        if wins:
+            return (wins & -wins).bit_length() - 1
+        if depth == 0:
+            return None
+        if opp_wins:
+            # The defender threatens too: only a block that is itself a
+            # threat keeps the initiative
+            if popcount(opp_wins) > 1:
+                return None
+            makes &= opp_wins
+        if not makes:
+            return None
+        key = (own, opp)
+        if self._failed.get(key, -1) >= depth:
+            return None
+
+        # Answer each threat-making move with its forced block; a move
+        # leaving two winning cells wins outright
+        singles = []
+        for move in iter_bits(makes):
+            bit = 1 << move
+            if opp_wins & ~bit:
+                continue  # the defender would simply win
+            threats = self._threats_through(own | bit, opp, move)
+            if popcount(threats) > 1:
+                return move
+            if threats:
+                singles.append((move, bit, threats))
+        for move, bit, block in singles:
+            if self._attack(own | bit, opp | block, depth - 1) is not None:
+                return move
+
+        self._failed[key] = depth
+        return None
+
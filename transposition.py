@@ -0,0 +1,139 @@
+# transposition.py
+# Zobrist hashing and a bounded transposition table for the AI search.
+
+import random
+import config
+
+# Bound types stored with each entry
+EXACT = 0
+LOWER = 1   # score is a lower bound (search failed high)
+UPPER = 2   # score is an upper bound (search failed low)
+
+# Entry layout: (key, depth, score, bound, best_move, generation)
+KEY, DEPTH, SCORE, BOUND, MOVE, GENERATION = range(6)
+
+
+class ZobristKeys:
+    """One random 64-bit key per (player, cell) for a given BoardLayout."""
+    def __init__(self, layout, seed=0x4E7A):
+        rng = random.Random(seed)
+        self.layout = layout
+        self.keys = {
+            player: [rng.getrandbits(64) for _ in range(layout.size)]
+            for player in (config.HUMAN_PLAYER, config.AI_PLAYER)
+        }
+
+    def hash_board(self, board):
+        """Full hash of a Bitboard; searches then update it incrementally."""
+        h = 0
+        for player, mask in board.masks.items():
+            keys = self.keys[player]
+            while mask:
+                low = mask & -mask
+                h ^= keys[low.bit_length() - 1]
+                mask ^= low
+        return h
+
+
+_zobrist = {}
+
+def get_zobrist(layout):
+    """Returns the shared ZobristKeys for a layout."""
+    key = (layout.radius, layout.winning_length)
+    keys = _zobrist.get(key)
+    if keys is None:
+        keys = _zobrist[key] = ZobristKeys(layout)
+    return keys
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of search results keyed by Zobrist hash.
+
+    Each bucket has two slots: a depth-preferred slot that only yields to
+    deeper (or stale) results, and an always-replace slot that takes
+    everything else. 'max_entries' caps the total number of slots.
+    The table can be kept between moves; call new_search() before each
+    search so entries from earlier moves age out of the depth-preferred slots.
+    """
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = config.TRANSPOSITION_TABLE_SIZE
+        self.buckets = max(1, max_entries // 2)
+        self.slots = [None] * (self.buckets * 2)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * (self.buckets * 2)
+        self.generation = 0
+
+    def probe(self, key):
+        """Returns the entry tuple stored for 'key', or None."""
+        base = (key % self.buckets) * 2
+        slots = self.slots
+        for slot in (base, base + 1):
+            entry = slots[slot]
+            if entry is not None and entry[KEY] == key:
+                self.hits += 1
+                return entry
+        if slots[base] is not None or slots[base + 1] is not None:
+            self.collisions += 1
+        self.misses += 1
+        return None
+
+    def lookup(self, key):
+        """Like probe(), but without touching the hit/miss counters."""
+        base = (key % self.buckets) * 2
+        for entry in (self.slots[base], self.slots[base + 1]):
+            if entry is not None and entry[KEY] == key:
+                return entry
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        base = (key % self.buckets) * 2
+        slots = self.slots
+        entry = (key, depth, score, bound, move, self.generation)
+        self.stores += 1
+        preferred = slots[base]
+        if (
+            preferred is None
+            or preferred[KEY] == key
+            or depth >= preferred[DEPTH]
+            or preferred[GENERATION] != self.generation
+        ):
+            slots[base] = entry
+        else:
+            slots[base + 1] = entry
+
+    def entries(self, since_generation=0, limit=None):
+        """Stored entries from searches since 'since_generation', deepest first (at most 'limit')."""
+        found = [entry for entry in self.slots
+                 if entry is not None and entry[GENERATION] >= since_generation]
+        found.sort(key=lambda entry: entry[DEPTH], reverse=True)
+        return found[:limit] if limit is not None else found
+
+    def load(self, entries):
+        """Stores entries taken from another table (see entries()) in the current search."""
+        for entry in entries:
+            self.store(entry[KEY], entry[DEPTH], entry[SCORE], entry[BOUND], entry[MOVE])
+
+    def stats(self):
+        """Counters for sizing the table."""
+        used = sum(1 for entry in self.slots if entry is not None)
+        probes = self.hits + self.misses
+        return {
+            "entries": used,
+            "capacity": len(self.slots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
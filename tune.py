@@ -0,0 +1,270 @@
+# tune.py
+# Fits the evaluation weights (config.EVAL_WEIGHTS) to game outcomes.
+#
+#   python arena.py --engine-a Medium --engine-b Hard --pairs 5000 --records games.hxr
+#   python tune.py games.hxr [more.hxr ...] --out fitted.json
+#   cp fitted.json eval_weights.json      (ai loads this file at startup)
+#
+# Texel-style tuning: the evaluation e of a position, from the AI's view,
+# is mapped to an expected result sigmoid(K * e) (1 = O wins, 0 = X wins,
+# 0.5 = draw) and the weights are fitted to minimise the squared error
+# against the results of the games the positions came from. K is fitted
+# first, with the current weights, and then held fixed.
+#
+# evaluate_board is linear in the weights, so each position reduces once
+# to its counts of every pattern (see ai.window_patterns) and the fit never
+# touches a board again. Counting runs over the games in parallel across
+# processes, with an IncrementalEvaluator per game whose "scores" pack all
+# the counts into one integer; identical count vectors are then merged,
+# which leaves the fit a few thousand rows, vectorised with NumPy when it
+# is installed. The "line" weight only scores finished games and is kept.
+
+import argparse
+import json
+import math
+import sys
+import time
+
+import ai
+import config
+import parallel_search
+from batch_eval import HAS_NUMPY
+from evaluator import IncrementalEvaluator
+from records import RecordReader
+
+if HAS_NUMPY:
+    import numpy as np
+
+# The weights tune.py fits, in the order of a count vector
+TUNED = ("one_short", "two_short", "opponent_one_short", "opponent_two_short")
+# Bits per pattern count in the packed evaluator score
+COUNT_BITS = 16
+COUNT_MASK = (1 << COUNT_BITS) - 1
+
+RESULT_VALUES = {config.AI_PLAYER: 1.0, config.HUMAN_PLAYER: 0.0, "Draw": 0.5}
+
+
+# ---------------------------------------------------------------------- #
+#                           PATTERN COUNTING                             #
+# ---------------------------------------------------------------------- #
+def _count_table(length):
+    """
+    A window score table for IncrementalEvaluator whose total is the
+    pattern counts of the whole board, COUNT_BITS bits per TUNED pattern.
+    """
+    table = []
+    for ai_count in range(length + 1):
+        row = []
+        for human_count in range(length + 1):
+            value = 0
+            if ai_count + human_count <= length:
+                for name in ai.window_patterns(ai_count, human_count, length):
+                    if name in TUNED:
+                        value += 1 << (COUNT_BITS * TUNED.index(name))
+            row.append(value)
+        table.append(row)
+    return table
+
+
+def _unpack_counts(packed):
+    return tuple((packed >> (COUNT_BITS * i)) & COUNT_MASK for i in range(len(TUNED)))
+
+
+def _count_worker(path, part, parts, skip_plies):
+    """
+    Worker process: the count vectors of the positions in every parts-th
+    game of a record file, starting at game 'part'. Returns
+    {counts: [positions, sum of results]}.
+
+    Skipped: the first 'skip_plies' positions of each game, unfinished
+    games, and positions where the side to move can win at once (their
+    result does not depend on the evaluation).
+    """
+    rows = {}
+    with RecordReader(path) as reader:
+        layout = reader.layout
+        table = _count_table(layout.winning_length)
+        win_now = {config.AI_PLAYER: TUNED.index("one_short"),
+                   config.HUMAN_PLAYER: TUNED.index("opponent_one_short")}
+        for number, record in enumerate(reader):
+            if number % parts != part or record.result not in RESULT_VALUES:
+                continue
+            result = RESULT_VALUES[record.result]
+            evaluator = IncrementalEvaluator(layout, table)
+            player = config.HUMAN_PLAYER
+            for ply, move in enumerate(record.moves):
+                if ply >= skip_plies:
+                    counts = _unpack_counts(evaluator.score)
+                    if not counts[win_now[player]]:
+                        row = rows.get(counts)
+                        if row is None:
+                            row = rows[counts] = [0, 0.0]
+                        row[0] += 1
+                        row[1] += result
+                evaluator.place(move, player)
+                player = config.AI_PLAYER if player == config.HUMAN_PLAYER else config.HUMAN_PLAYER
+    return rows
+
+
+def collect(paths, workers=None, skip_plies=2):
+    """Merged {counts: [positions, sum of results]} over record files, counted in parallel."""
+    layouts = set()
+    for path in paths:
+        with RecordReader(path) as reader:
+            layouts.add((reader.layout.radius, reader.layout.winning_length))
+    if len(layouts) > 1:
+        raise ValueError("record files hold games for different board sizes")
+
+    workers = parallel_search.resolve_workers(workers)
+    parts = workers * 4 if workers > 1 else 1  # several tasks per process evens out the load
+    if workers > 1:
+        pool = parallel_search.get_pool(workers)
+        futures = [pool.submit(_count_worker, path, part, parts, skip_plies)
+                   for path in paths for part in range(parts)]
+        results = [future.result() for future in futures]
+    else:
+        results = [_count_worker(path, 0, 1, skip_plies) for path in paths]
+
+    rows = {}
+    for result in results:
+        for counts, (positions, total) in result.items():
+            row = rows.get(counts)
+            if row is None:
+                row = rows[counts] = [0, 0.0]
+            row[0] += positions
+            row[1] += total
+    return rows, layouts.pop()
+
+
+# ---------------------------------------------------------------------- #
+#                                FITTING                                 #
+# ---------------------------------------------------------------------- #
+class Corpus:
+    """
+    Merged count vectors: 'counts' (one row per distinct vector),
+    'positions' per row and 'targets', the mean result of each row.
+    """
+    def __init__(self, rows):
+        items = sorted(rows.items())
+        self.counts = [counts for counts, _ in items]
+        self.positions = [positions for _, (positions, _) in items]
+        self.targets = [total / positions for _, (positions, total) in items]
+        self.total = sum(self.positions)
+        if HAS_NUMPY:
+            self.counts = np.array(self.counts, dtype=np.float64).reshape(-1, len(TUNED))
+            self.positions = np.array(self.positions, dtype=np.float64)
+            self.targets = np.array(self.targets, dtype=np.float64)
+
+    def loss_and_gradient(self, weights, k):
+        """
+        Mean squared error of sigmoid(k * eval) against the results, and
+        its gradient with respect to the weights.
+        """
+        if HAS_NUMPY:
+            evals = self.counts @ np.asarray(weights, dtype=np.float64)
+            predicted = 1.0 / (1.0 + np.exp(-np.clip(k * evals, -60.0, 60.0)))
+            error = predicted - self.targets
+            loss = float((self.positions * error * error).sum()) / self.total
+            slope = self.positions * 2.0 * error * predicted * (1.0 - predicted) * k
+            return loss, (slope @ self.counts / self.total).tolist()
+        loss = 0.0
+        gradient = [0.0] * len(weights)
+        for counts, positions, target in zip(self.counts, self.positions, self.targets):
+            value = k * sum(c * w for c, w in zip(counts, weights))
+            predicted = 1.0 / (1.0 + math.exp(-max(-60.0, min(60.0, value))))
+            error = predicted - target
+            loss += positions * error * error
+            slope = positions * 2.0 * error * predicted * (1.0 - predicted) * k
+            for i, c in enumerate(counts):
+                gradient[i] += slope * c
+        return loss / self.total, [g / self.total for g in gradient]
+
+    def loss(self, weights, k):
+        return self.loss_and_gradient(weights, k)[0]
+
+
+def fit_scale(corpus, weights):
+    """The K minimising the error for fixed weights (golden-section search on log K)."""
+    low, high = math.log(1e-6), math.log(1.0)
+    ratio = (math.sqrt(5) - 1) / 2
+    a, b = high - ratio * (high - low), low + ratio * (high - low)
+    loss_a, loss_b = corpus.loss(weights, math.exp(a)), corpus.loss(weights, math.exp(b))
+    for _ in range(60):
+        if loss_a < loss_b:
+            high, b, loss_b = b, a, loss_a
+            a = high - ratio * (high - low)
+            loss_a = corpus.loss(weights, math.exp(a))
+        else:
+            low, a, loss_a = a, b, loss_b
+            b = low + ratio * (high - low)
+            loss_b = corpus.loss(weights, math.exp(b))
+    return math.exp((low + high) / 2)
+
+
+def fit_weights(corpus, start, k, iterations=2000, rate=0.02, progress=None):
+    """
+    Adam on each weight's ratio to its starting value, so the weights keep
+    their signs and all move on the same relative scale. Returns the
+    weights with the lowest error seen.
+    """
+    ratios = [1.0] * len(start)
+    first = [0.0] * len(start)
+    second = [0.0] * len(start)
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-12
+    best_loss, best = None, list(start)
+    for step in range(1, iterations + 1):
+        weights = [s * r for s, r in zip(start, ratios)]
+        loss, gradient = corpus.loss_and_gradient(weights, k)
+        if best_loss is None or loss < best_loss:
+            best_loss, best = loss, weights
+        for i, g in enumerate(gradient):
+            g *= start[i]
+            first[i] = beta1 * first[i] + (1 - beta1) * g
+            second[i] = beta2 * second[i] + (1 - beta2) * g * g
+            corrected = first[i] / (1 - beta1 ** step)
+            scale = math.sqrt(second[i] / (1 - beta2 ** step)) + epsilon
+            ratios[i] = max(0.01, ratios[i] - rate * corrected / scale)
+        if progress is not None and step % 200 == 0:
+            progress(step, loss)
+    return best, best_loss
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit HexaTac evaluation weights to game records.")
+    parser.add_argument("records", nargs="+", help="record files (see records.py / arena.py --records)")
+    parser.add_argument("--out", required=True,
+                        help=f"weights file to write; the AI only uses {config.EVAL_WEIGHTS_PATH}")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+    parser.add_argument("--skip-plies", type=int, default=2, help="opening positions left out of each game")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    rows, (radius, winning_length) = collect(args.records, args.workers, args.skip_plies)
+    corpus = Corpus(rows)
+    if not corpus.total:
+        print("no usable positions in the records")
+        return 1
+    print(f"radius {radius}, {winning_length} in a row: {corpus.total} positions, "
+          f"{len(rows)} distinct pattern counts ({time.perf_counter() - started:.1f}s)")
+
+    start = [config.EVAL_WEIGHTS[name] for name in TUNED]
+    k = fit_scale(corpus, start)
+    print(f"K = {k:.3g}, error with the current weights {corpus.loss(start, k):.5f}")
+
+    weights, loss = fit_weights(corpus, start, k, args.iterations, args.rate,
+                                lambda step, loss: print(f"  step {step}: error {loss:.5f}"))
+    fitted = dict(config.EVAL_WEIGHTS)
+    fitted.update({name: int(round(w)) for name, w in zip(TUNED, weights)})
+    with open(args.out, "w") as f:
+        json.dump(fitted, f, indent=2)
+        f.write("\n")
+    print(f"error {loss:.5f} ({time.perf_counter() - started:.1f}s); wrote {args.out}")
+    for name in TUNED:
+        print(f"  {name}: {config.EVAL_WEIGHTS[name]} -> {fitted[name]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())